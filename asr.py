@@ -0,0 +1,98 @@
+import json, queue
+
+SAMPLE_RATE = 16000
+BLOCK_SIZE = 1600  # 0.1 s of audio per callback
+MAX_BACKLOG = 2.0  # seconds of audio kept before the oldest chunks are dropped
+
+
+#Vosk grammar (JSON list of phrases) limited to the given phrases and their words,
+#anything else is decoded as [unk]
+def build_grammar(phrases):
+    phrases = sorted({" ".join(p.lower().split()) for p in phrases if p.strip()})
+    words = sorted({w for p in phrases for w in p.split()} - set(phrases))
+    return json.dumps(phrases + words + ["[unk]"])
+
+
+def _clean(text):
+    return " ".join(w for w in text.lower().split() if w != "[unk]")
+
+
+#Vosk decoding worker, consumes every queued audio chunk as fast as it arrives
+#Sends (text, None) for final results and, in streaming mode, (partial, intent)
+#as soon as a partial transcript is exactly one of the early_phrases
+class AsrWorker:
+    def __init__(self, recognizer, block_size=BLOCK_SIZE, max_backlog=MAX_BACKLOG, early_phrases=None):
+        self.recognizer = recognizer
+        self.early_phrases = early_phrases or {}
+        self.fired = None  # early intent already sent for the current utterance
+        self.next_recognizer = None
+        self.early_hits = 0
+        self.chunk_seconds = block_size / SAMPLE_RATE
+        self.audio_q = queue.Queue(maxsize=max(1, int(max_backlog / self.chunk_seconds)))
+        self.dropped_chunks = 0
+        self.decoded_chunks = 0
+        self.peak_backlog = 0
+
+    #sounddevice callback, runs on the audio thread so it must never block
+    def audio_callback(self, indata, _frames, _time, status):
+        if status:
+            print("Audio error:", status)
+        data = bytes(indata)
+        while True:
+            try:
+                self.audio_q.put_nowait(data)
+                return
+            except queue.Full:
+                try:
+                    self.audio_q.get_nowait()
+                    self.dropped_chunks += 1
+                except queue.Empty:
+                    pass
+
+    #Swap the recognizer (e.g. a rebuilt grammar), applied on the ASR thread at the next step
+    def use_recognizer(self, recognizer):
+        self.next_recognizer = recognizer
+
+    #Seconds of audio waiting to be decoded
+    def backlog(self):
+        return self.audio_q.qsize() * self.chunk_seconds
+
+    def feed(self, data, text_q):
+        self.decoded_chunks += 1
+        if self.recognizer.AcceptWaveform(data):
+            text = _clean(json.loads(self.recognizer.Result()).get("text", ""))
+            print(f"Heard: '{text}'")
+            #an empty final still closes an utterance that fired early
+            if text or self.fired:
+                text_q.put_latest((text, None))
+            self.fired = None
+        elif self.early_phrases:
+            partial = _clean(json.loads(self.recognizer.PartialResult()).get("partial", ""))
+            intent = self.early_phrases.get(partial)
+            if intent and intent != self.fired:
+                self.fired = intent
+                self.early_hits += 1
+                print(f"Heard (partial): '{partial}' -> {intent}")
+                text_q.put_latest((partial, intent))
+
+    #Wait for audio, then decode everything that is queued
+    def step(self, text_q, timeout=0.1):
+        try:
+            data = self.audio_q.get(timeout=timeout)
+        except queue.Empty:
+            return
+        if self.next_recognizer:
+            self.recognizer, self.next_recognizer = self.next_recognizer, None
+            self.fired = None
+        self.peak_backlog = max(self.peak_backlog, self.audio_q.qsize() + 1)
+        while data is not None:
+            self.feed(data, text_q)
+            try:
+                data = self.audio_q.get_nowait()
+            except queue.Empty:
+                data = None
+
+    def stats(self):
+        return (f"asr: {self.decoded_chunks} chunks decoded, {self.dropped_chunks} dropped, "
+                f"{self.early_hits} early intents, "
+                f"backlog {self.backlog():.1f}s (peak {self.peak_backlog * self.chunk_seconds:.1f}s)")
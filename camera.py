@@ -0,0 +1,55 @@
+import threading
+import cv2
+import numpy as np
+
+
+#Grabs camera frames as fast as the driver delivers them (run step() as a pipeline stage),
+#keeping only the newest mirrored frame. Capture and flip write into reused buffers.
+class CameraGrabber:
+    def __init__(self, cap, stop_event, pool_size=4):
+        self.cap = cap
+        self.stop_event = stop_event
+        self.raw = None  # reused by cap.read
+        self.latest = None  # newest mirrored frame
+        self.frame_id = 0
+        self.read_id = 0  # last frame handed to the consumer
+        self.dropped = 0
+        self.new_frame = threading.Condition()
+        #buffers handed out by read_latest, rotated so a frame still queued or shown isn't overwritten
+        self.pool = [None] * pool_size
+        self.pool_index = 0
+
+    def step(self):
+        ok, frame = self.cap.read(self.raw)
+        if not ok:
+            print("Camera closed")
+            self.stop_event.set()
+            with self.new_frame:
+                self.new_frame.notify_all()
+            return
+        self.raw = frame
+        with self.new_frame:
+            if self.latest is None or self.latest.shape != frame.shape:
+                self.latest = np.empty_like(frame)
+            cv2.flip(frame, 1, dst=self.latest)
+            self.frame_id += 1
+            self.new_frame.notify_all()
+
+    #Wait for a frame newer than the last one read, None on timeout
+    def read_latest(self, timeout=0.1):
+        with self.new_frame:
+            self.new_frame.wait_for(lambda: self.frame_id != self.read_id or self.stop_event.is_set(), timeout)
+            if self.frame_id == self.read_id:
+                return None
+            if self.read_id:
+                self.dropped += self.frame_id - self.read_id - 1
+            self.read_id = self.frame_id
+            out = self.pool[self.pool_index]
+            if out is None or out.shape != self.latest.shape:
+                out = self.pool[self.pool_index] = np.empty_like(self.latest)
+            np.copyto(out, self.latest)
+            self.pool_index = (self.pool_index + 1) % len(self.pool)
+            return out
+
+    def stats(self):
+        return f"camera: {self.frame_id} frames grabbed, {self.dropped} stale frames skipped"
@@ -0,0 +1,77 @@
+import glob, os, time
+from contextlib import contextmanager
+
+from cflib.crazyflie import Crazyflie
+from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+
+
+#Wall-clock time of each connection phase, marked from the Crazyflie callbacks
+#(link open, TOCs fetched) and by the caller (estimator wait)
+class ConnectionTimings:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = []  # (name, seconds since the previous phase)
+        self.last = self.start
+        self.toc_cached = None
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def watch(self, cf):
+        cf.link_established.add_callback(lambda _uri: self.mark("link open"))
+        cf.connected.add_callback(lambda _uri: self.mark("TOC fetch"))
+
+    def stats(self):
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases)
+        toc = {None: "", True: " (TOC from cache)", False: " (TOC downloaded)"}[self.toc_cached]
+        return f"connection: {phases}, total {self.last - self.start:.2f}s{toc}"
+
+
+#TOC cache directory to hand to cflib, None (no caching) if it can't be written
+def usable_cache_dir(cache_dir):
+    if not cache_dir:
+        return None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:
+        print(f"TOC cache disabled, cannot create {cache_dir}: {e}")
+        return None
+    if not os.access(cache_dir, os.W_OK):
+        print(f"TOC cache disabled, {cache_dir} is not writable")
+        return None
+    return cache_dir
+
+
+def _open(uri, cache_dir, timings):
+    cf = Crazyflie(rw_cache=cache_dir)
+    timings.watch(cf)
+    scf = SyncCrazyflie(uri, cf=cf)
+    scf.open_link()
+    return scf
+
+
+#Connects with the log/param TOCs cached in cache_dir. cflib keys cached TOCs by their CRC,
+#so after a firmware update the old files simply miss and the new TOCs are downloaded;
+#if connecting with the cache fails anyway (e.g. an unreadable cache file) it retries without.
+@contextmanager
+def open_crazyflie(uri, cache_dir, timings=None):
+    timings = timings or ConnectionTimings()
+    cache_dir = usable_cache_dir(cache_dir)
+    before = set(glob.glob(os.path.join(cache_dir, "*.json"))) if cache_dir else set()
+    try:
+        scf = _open(uri, cache_dir, timings)
+    except Exception as e:
+        if not cache_dir:
+            raise
+        print(f"Connecting with the TOC cache failed ({e}), retrying without it")
+        timings.mark("failed cached attempt")
+        cache_dir = None
+        scf = _open(uri, None, timings)
+    if cache_dir:
+        timings.toc_cached = set(glob.glob(os.path.join(cache_dir, "*.json"))) == before
+    try:
+        yield scf
+    finally:
+        scf.close_link()
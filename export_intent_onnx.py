@@ -0,0 +1,67 @@
+import os, sys, time
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+from onnxruntime.quantization import quantize_dynamic, QuantType
+
+from intent import intent_examples, OnnxEncoder, CONFIDENCE_THRESHOLD, flatten_examples
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+OUT_DIR = "intent_onnx"
+
+# === Export the transformer of the sentence-transformers model to ONNX ===
+os.makedirs(OUT_DIR, exist_ok=True)
+st_model = SentenceTransformer(MODEL_NAME, device="cpu")
+hf_model = st_model[0].auto_model.eval()
+st_model.tokenizer.save_pretrained(OUT_DIR)  # writes tokenizer.json
+
+dummy = st_model.tokenizer(["take off"], return_tensors="pt")
+inputs = ("input_ids", "attention_mask", "token_type_ids")
+fp32_path = os.path.join(OUT_DIR, "model.onnx")
+with torch.no_grad():
+    torch.onnx.export(hf_model, tuple(dummy[name] for name in inputs), fp32_path,
+                      input_names=list(inputs), output_names=["last_hidden_state"],
+                      dynamic_axes={name: {0: "batch", 1: "sequence"} for name in inputs + ("last_hidden_state",)},
+                      opset_version=14)
+print(f"✅ Exported {fp32_path}")
+
+# === Quantize weights to int8 ===
+int8_path = os.path.join(OUT_DIR, "model_quantized.onnx")
+quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+print(f"✅ Quantized model saved as {int8_path}")
+
+# === Parity check on the intent_examples set ===
+#Each phrase is matched against all other examples (leave-one-out), the decision
+#(best intent, or None under the confidence threshold) must be the same for both backends
+def decisions(embeddings, labels):
+    sims = embeddings @ embeddings.T
+    np.fill_diagonal(sims, -np.inf)
+    best = sims.argmax(axis=1)
+    return [labels[j] if sims[i, j] > CONFIDENCE_THRESHOLD else None for i, j in enumerate(best)]
+
+def per_utterance_ms(encode, phrases):
+    start = time.perf_counter()
+    for phrase in phrases:
+        encode(phrase)
+    return (time.perf_counter() - start) / len(phrases) * 1000
+
+phrases, labels = flatten_examples(intent_examples)
+onnx_model = OnnxEncoder(OUT_DIR)
+torch_emb = st_model.encode(phrases, normalize_embeddings=True)
+onnx_emb = onnx_model.encode(phrases)
+
+drift = 1.0 - (torch_emb * onnx_emb).sum(axis=1)
+torch_dec, onnx_dec = decisions(torch_emb, labels), decisions(onnx_emb, labels)
+mismatches = [(p, t, o) for p, t, o in zip(phrases, torch_dec, onnx_dec) if t != o]
+
+print(f"\n📊 Max cosine drift: {drift.max():.4f} (mean {drift.mean():.4f})")
+print(f"📊 Decisions matching: {len(phrases) - len(mismatches)}/{len(phrases)}")
+for phrase, t, o in mismatches:
+    print(f"   '{phrase}': torch={t} onnx={o}")
+print(f"⏱ torch: {per_utterance_ms(st_model.encode, phrases):.1f} ms/utterance, "
+      f"onnx int8: {per_utterance_ms(onnx_model.encode, phrases):.1f} ms/utterance")
+
+if mismatches:
+    print("❌ ONNX backend does not match the torch decisions")
+    sys.exit(1)
+print("✅ ONNX backend matches, set INTENT_BACKEND = \"onnx\" in main.py to use it")
@@ -0,0 +1,80 @@
+import time, warnings
+from collections import Counter, deque
+import joblib
+import numpy as np
+
+from gesture_features import NUM_FEATURES
+
+FEATURE_NAMES = [f"x{i}" for i in range(NUM_FEATURES)]
+
+
+#Gesture classifier fed straight from the 126-wide feature buffer (no pandas per frame),
+#the feature columns the model was trained on are checked once at load time
+class GesturePredictor:
+    def __init__(self, path):
+        self.model = joblib.load(path)
+        names = getattr(self.model, "feature_names_in_", None)
+        if names is not None:
+            if list(names) != FEATURE_NAMES:
+                raise ValueError(f"{path} was trained on unexpected columns {list(names)[:3]}..., expected x0..x{NUM_FEATURES - 1}")
+        n_features = getattr(self.model, "n_features_in_", NUM_FEATURES)
+        if n_features != NUM_FEATURES:
+            raise ValueError(f"{path} expects {n_features} features, got {NUM_FEATURES}")
+        self.calls = 0
+        self.total_time = 0.0
+        self.last_latency = 0.0
+
+    def predict(self, features):
+        start = time.perf_counter()
+        #columns were validated at load time, the NumPy input doesn't need names
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            label = self.model.predict(features.reshape(1, -1))[0]
+        self.last_latency = time.perf_counter() - start
+        self.calls += 1
+        self.total_time += self.last_latency
+        return label
+
+    def stats(self):
+        avg = self.total_time / self.calls if self.calls else 0.0
+        return f"gesture model: {self.calls} predictions, {avg * 1000:.2f} ms avg"
+
+
+#Temporal filter over the per-frame predictions: a gesture is only reported while it holds
+#min_votes of the last `window` frames, and a frame is not classified again when the
+#hand pose moved less than still_threshold (normalized units) since the last classification
+class GestureTracker:
+    def __init__(self, predictor, window=5, min_votes=4, still_threshold=0.05):
+        self.predictor = predictor
+        self.history = deque(maxlen=window)
+        self.min_votes = min_votes
+        self.still_threshold = still_threshold
+        self.last_features = np.zeros(NUM_FEATURES, dtype=np.float32)
+        self.last_hands = 0
+        self.last_label = None
+        self.frames = 0
+        self.skipped = 0
+
+    def update(self, features, num_hands):
+        self.frames += 1
+        if not num_hands:
+            label = None
+        elif (num_hands == self.last_hands and self.last_label is not None
+              and np.abs(features - self.last_features).max() < self.still_threshold):
+            label = self.last_label
+            self.skipped += 1
+        else:
+            label = self.predictor.predict(features)
+            self.last_features[:] = features
+        self.last_hands, self.last_label = num_hands, label
+        self.history.append(label)
+
+        votes = Counter(l for l in self.history if l is not None)
+        if votes:
+            gesture, count = votes.most_common(1)[0]
+            if count >= self.min_votes:
+                return gesture
+        return None
+
+    def stats(self):
+        return f"gesture tracker: {self.frames} frames, {self.skipped} classifications skipped (hand still)"
@@ -0,0 +1,282 @@
+import glob, hashlib, json, os, re, time
+from collections import OrderedDict
+import numpy as np
+
+CONFIDENCE_THRESHOLD = 0.50
+#A keyword anywhere in the transcript overrides the embedding match
+KEYWORDS = ["forward", "back", "left", "right", "up", "down", "spin", "shake"]
+
+intent_examples = {
+    "takeoff": ["take off", "please take off", "can you take off", "lift off", "start flying"],
+    "land": ["land", "please land", "can you land", "stop flying", "touch down"],
+    "forward": ["go forward", "move forward", "fly forward"],
+    "back": ["go back", "move back", "fly backward"],
+    "left": ["go left", "move left", "fly to the left"],
+    "right": ["go right", "move right", "fly to the right"],
+    "up": ["go up", "fly higher", "ascend", "climb up"],
+    "down": ["go down", "fly lower", "descend"],
+    "excited": ["get excited", "do a jump", "show excitement", "bounce", "good"],
+    "happy": ["be happy", "do a happy dance", "wiggle", "celebrate"],
+    "sad": ["look sad", "be sad", "descend sadly"],
+    "spin": ["spin", "spin around", "twirl"],
+    "shake": ["shake", "shake your head", "wiggle head"],
+    "come here": ["come here", "fly to me", "come closer", "approach me"],
+    "stop": ["stop", "halt", "land now", "end movement"],
+    "learn_trick": ["learn a new trick", "teach a new trick", "create a command"],
+    "end_trick": ["end trick", "and trick", "finish trick", "done with trick", "save trick"]
+}
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+#LRU cache of normalized transcript -> [embedding, intent, intent_valid],
+#so repeated commands skip the transformer forward pass
+class IntentCache:
+    def __init__(self, max_size=256):
+        self.entries = OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    #A hit is an entry with a valid intent, stale entries still hold a usable embedding
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        if entry is not None and entry[2]:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return entry
+
+    def put(self, key, embedding, intent):
+        self.entries[key] = [embedding, intent, True]
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    #The example set changed: embeddings stay valid, the decided intents don't
+    def invalidate_intents(self):
+        for entry in self.entries.values():
+            entry[2] = False
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"intent cache: {len(self.entries)}/{self.max_size} entries, {self.hits} hits, {self.misses} misses ({rate:.0%})"
+
+
+def flatten_examples(examples):
+    phrases, labels = [], []
+    for k, v in examples.items():
+        for phrase in v:
+            if phrase not in phrases:
+                phrases.append(phrase)
+                labels.append(k)
+    return phrases, labels
+
+
+#Embedding store file, named after a hash of the encoder and the example list
+def _store_path(cache_dir, model_name, phrases, labels):
+    digest = hashlib.sha1(json.dumps([model_name, phrases, labels]).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"intent_examples_{digest}.npy")
+
+
+#Example phrases with their unit-length embeddings in a preallocated matrix,
+#adding or removing a single example is O(d) (the matrix doubles when full)
+class IntentIndex:
+    def __init__(self, dim, capacity=128):
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.phrases = []
+        self.labels = []
+        self.rows = {}  # phrase -> row in matrix
+
+    #matrix may be a read-only memmap, it is copied on the first change
+    @classmethod
+    def from_matrix(cls, phrases, labels, matrix):
+        index = cls(matrix.shape[1], capacity=0)
+        index.matrix = matrix
+        index.phrases = list(phrases)
+        index.labels = list(labels)
+        index.rows = {p: i for i, p in enumerate(index.phrases)}
+        return index
+
+    @classmethod
+    def build(cls, encode, examples):
+        phrases, labels = flatten_examples(examples)
+        embeddings = np.asarray(encode(phrases), dtype=np.float32)
+        index = cls(embeddings.shape[1], capacity=max(128, 2 * len(phrases)))
+        for phrase, label, embedding in zip(phrases, labels, embeddings):
+            index.add(phrase, label, embedding)
+        return index
+
+    #Load the example embeddings from cache_dir (memory mapped), encode and store them
+    #only when the examples or the model changed
+    @classmethod
+    def load_or_build(cls, encode, examples, model_name, cache_dir="cache"):
+        phrases, labels = flatten_examples(examples)
+        path = _store_path(cache_dir, model_name, phrases, labels)
+        if os.path.exists(path):
+            try:
+                matrix = np.load(path, mmap_mode="r")
+                if matrix.shape[0] == len(phrases):
+                    print(f"Loaded intent embeddings from {path}")
+                    return cls.from_matrix(phrases, labels, matrix)
+            except (OSError, ValueError) as e:
+                print("Could not load intent embeddings, re-encoding:", e)
+        index = cls.build(encode, examples)
+        os.makedirs(cache_dir, exist_ok=True)
+        for old in glob.glob(os.path.join(cache_dir, "intent_examples_*.npy")):
+            os.remove(old)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, index.matrix[:len(index)])
+        os.replace(path + ".tmp", path)
+        print(f"Saved intent embeddings to {path}")
+        return index
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def _reserve(self, rows):
+        if rows <= len(self.matrix) and self.matrix.flags.writeable:
+            return
+        n = len(self.phrases)
+        grown = np.zeros((max(rows, 2 * len(self.matrix), 128), self.matrix.shape[1]), dtype=np.float32)
+        grown[:n] = self.matrix[:n]
+        self.matrix = grown
+
+    def add(self, phrase, label, embedding):
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        vec = vec / (np.linalg.norm(vec) or 1.0)
+        row = self.rows.get(phrase, len(self.phrases))
+        self._reserve(row + 1)
+        if row == len(self.phrases):
+            self.phrases.append(phrase)
+            self.labels.append(label)
+            self.rows[phrase] = row
+        self.labels[row] = label
+        self.matrix[row] = vec
+
+    #Move the last row into the freed slot
+    def remove(self, phrase):
+        self._reserve(len(self.phrases))
+        row = self.rows.pop(phrase)
+        last = len(self.phrases) - 1
+        if row != last:
+            self.matrix[row] = self.matrix[last]
+            self.phrases[row] = self.phrases[last]
+            self.labels[row] = self.labels[last]
+            self.rows[self.phrases[row]] = row
+        self.matrix[last] = 0.0
+        self.phrases.pop()
+        self.labels.pop()
+
+    def label_of(self, phrase):
+        row = self.rows.get(phrase)
+        return None if row is None else self.labels[row]
+
+    #Best matching intent and its cosine similarity
+    def match(self, embedding):
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        sims = self.matrix[:len(self.phrases)] @ vec
+        idx = int(sims.argmax())
+        return self.labels[idx], float(sims[idx]) / (float(np.linalg.norm(vec)) or 1.0)
+
+
+#Tiered intent classifier, cheapest tier first: exact example phrase, keyword,
+#cached result and finally the sentence encoder, with per-tier latency counters
+class IntentClassifier:
+    TIERS = ("exact", "keyword", "cache", "model")
+
+    def __init__(self, encoder, index, cache, keywords=KEYWORDS, threshold=CONFIDENCE_THRESHOLD):
+        self.encoder = encoder
+        self.index = index
+        self.cache = cache
+        self.keywords = keywords
+        self.keyword_re = re.compile("|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True)))
+        self.threshold = threshold
+        self.timings = {tier: [0, 0.0] for tier in self.TIERS}  # tier -> [count, seconds]
+
+    def classify(self, text):
+        start = time.perf_counter()
+        intent, tier = self._classify(normalize(text))
+        timing = self.timings[tier]
+        timing[0] += 1
+        timing[1] += time.perf_counter() - start
+        return intent
+
+    def _classify(self, key):
+        label = self.index.label_of(key)
+        if label:
+            print(f"Intent match: {label} (exact)")
+            return label, "exact"
+        #same priority as the keyword list, not the position in the text
+        hits = set(self.keyword_re.findall(key))
+        for kw in self.keywords:
+            if kw in hits:
+                print(f"Keyword override: '{kw}' detected in text")
+                return kw, "keyword"
+        entry = self.cache.get(key)
+        if entry and entry[2]:
+            print(f"Intent (cached): {entry[1]}")
+            return entry[1], "cache"
+        #Sentence embedding, cosine similarity against the example index
+        embedding = entry[0] if entry else self.encoder.encode(key)
+        best_intent, confidence = self.index.match(embedding)
+        print(f"Intent match: {best_intent} ({confidence:.2f})")
+        intent = best_intent if confidence > self.threshold else None
+        self.cache.put(key, embedding, intent)
+        return intent, "model"
+
+    #One encode for the new phrase, cached decisions may change
+    #embedding skips the encoder when it is already known, returns the embedding used
+    def add_example(self, phrase, label, embedding=None):
+        if embedding is None:
+            embedding = self.encoder.encode(phrase)
+        self.index.add(phrase, label, embedding)
+        self.cache.invalidate_intents()
+        return embedding
+
+    def stats(self):
+        tiers = ", ".join(f"{tier} {n}x {total / n * 1000:.2f} ms" if n else f"{tier} 0x"
+                          for tier, (n, total) in self.timings.items())
+        return f"intent tiers: {tiers}; {self.cache.stats()}"
+
+
+#Sentence encoder running an exported (int8 quantized) MiniLM with ONNX Runtime,
+#encode() behaves like SentenceTransformer.encode for a string or a list of strings
+class OnnxEncoder:
+    def __init__(self, model_dir, model_file="model_quantized.onnx", max_length=256):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(os.path.join(model_dir, model_file), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_padding()
+        self.tokenizer.enable_truncation(max_length)
+
+    def encode(self, texts):
+        single = isinstance(texts, str)
+        batch = self.tokenizer.encode_batch([texts] if single else list(texts))
+        ids = np.array([e.ids for e in batch], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in batch], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        #mean pooling over the real tokens + L2 normalization, as in the sentence-transformers model
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled[0] if single else pooled
+
+
+#"torch" loads the SentenceTransformer, "onnx" the exported model in onnx_dir
+def load_encoder(backend, model_name, onnx_dir):
+    if backend == "onnx":
+        return OnnxEncoder(onnx_dir)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
@@ -1,86 +1,101 @@
-import time, json, queue, cv2, math, joblib, re
+import argparse, math, os, signal, time, threading, cv2, re
+from collections import deque
 import sounddevice as sd
 import mediapipe as mp
-import pandas as pd
 from vosk import Model, KaldiRecognizer
-from sentence_transformers import SentenceTransformer, util
 
 from cflib.crtp import init_drivers
-from cflib.crazyflie import Crazyflie
-from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.crazyflie.syncLogger import SyncLogger
 from cflib.crazyflie.high_level_commander import HighLevelCommander
 from cflib.crazyflie.log import LogConfig
-from cflib.utils.multiranger import Multiranger
+
+from connection import ConnectionTimings, open_crazyflie
+from pipeline import LatestQueue, next_item, start_stages, stop_stages
+from intent import intent_examples, load_encoder, IntentCache, IntentClassifier, IntentIndex
+from camera import CameraGrabber
+from telemetry import RangeTelemetry
+from safety import SafetyMonitor
+from perception import PerceptionMode
+from gesture_features import LandmarkExtractor
+from gesture_inference import GesturePredictor, GestureTracker
+from asr import AsrWorker, build_grammar, SAMPLE_RATE, BLOCK_SIZE
+from maneuvers import Maneuver, ManeuverScheduler, TrickMove, takeoff_ramp, compile_trick, trick, sad, shake, spin, happy, excited, droop
+from trajectory import TrajectoryLibrary, trajectory_memory
+from tricks import TrickStore
 
 # === Setup ===
 URI = 'radio://0/80/2M'
-init_drivers()
+USE_GRAMMAR = True  # restrict Vosk to the phrases the pet understands
+PERCEPTION_SCALE = 0.5  # downscale camera frames before hand detection
+TARGET_LOOP_TIME = 1 / 30  # seconds of hand detection per frame to aim for
+PREVIEW = "full"  # "full", "low" (PREVIEW_HZ, own thread) or "headless", see --preview
+PREVIEW_HZ = 5
+RANGE_PERIOD_MS = 50  # Multiranger log period
+USE_TRAJECTORIES = True  # upload animations and learned tricks to the Crazyflie's trajectory memory
+HOVER_POS = (0.0, 0.0, 0.5)  # where the drone hovers after takeoff, stored tricks are compiled from here
+MIN_CLEARANCE = 0.2  # meters, pre-empt a maneuver that gets closer than this to an obstacle
+CACHE_DIR = "cache"  # on-disk caches (intent embeddings, TOCs)
+TOC_CACHE_DIR = os.path.join(CACHE_DIR, "toc")  # log/param TOCs, see --toc-cache
+INTENT_MODEL_NAME = 'all-MiniLM-L6-v2'
+INTENT_BACKEND = "torch"  # or "onnx" after running export_intent_onnx.py
+ONNX_MODEL_DIR = "intent_onnx"
+TRICKS_FILE = "tricks.jsonl"  # learned tricks, kept across restarts
 
 # === Voice Model ===
 vosk_model = Model("model")
-recognizer = KaldiRecognizer(vosk_model, 16000)
-audio_q = queue.Queue()
-intent_model = SentenceTransformer('all-MiniLM-L6-v2')
-
-intent_examples = {
-    "takeoff": ["take off", "please take off", "can you take off", "lift off", "start flying"],
-    "land": ["land", "please land", "can you land", "stop flying", "touch down"],
-    "forward": ["go forward", "move forward", "fly forward"],
-    "back": ["go back", "move back", "fly backward"],
-    "left": ["go left", "move left", "fly to the left"],
-    "right": ["go right", "move right", "fly to the right"],
-    "up": ["go up", "fly higher", "ascend", "climb up"],
-    "down": ["go down", "fly lower", "descend"],
-    "excited": ["get excited", "do a jump", "show excitement", "bounce", "good"],
-    "happy": ["be happy", "do a happy dance", "wiggle", "celebrate"],
-    "sad": ["look sad", "be sad", "descend sadly"],
-    "spin": ["spin", "spin around", "twirl"],
-    "shake": ["shake", "shake your head", "wiggle head"],
-    "come here": ["come here", "fly to me", "come closer", "approach me"],
-    "stop": ["stop", "halt", "land now", "end movement"],
-    "learn_trick": ["learn a new trick", "teach a new trick", "create a command"],
-    "end_trick": ["end trick", "and trick", "finish trick", "done with trick", "save trick"]
+intent_model = load_encoder(INTENT_BACKEND, INTENT_MODEL_NAME, ONNX_MODEL_DIR)
+
+#Short commands that fire from Vosk partial results, before the end of the utterance
+EARLY_INTENTS = ("stop", "land", "spin")
+intent_index = IntentIndex.load_or_build(intent_model.encode, intent_examples, f"{INTENT_MODEL_NAME}:{INTENT_BACKEND}",
+                                         cache_dir=CACHE_DIR)
+intent_classifier = IntentClassifier(intent_model, intent_index, IntentCache(max_size=256))
+
+NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    "half": 0.5, "quarter": 0.25
 }
-flat_examples, intent_labels = [], []
-for k, v in intent_examples.items():
-    flat_examples.extend(v)
-    intent_labels.extend([k]*len(v))
-example_embeddings = intent_model.encode(flat_examples)
+DISTANCE_WORDS = ["meter", "meters", "a meter", "a half meter"]
+
+#Grammar-constrained recognizer built from the intent examples (incl. learned tricks)
+#and the numbers understood by extract_distance
+def make_recognizer(grammar=USE_GRAMMAR):
+    if not grammar:
+        return KaldiRecognizer(vosk_model, SAMPLE_RATE)
+    phrases = intent_index.phrases + list(NUMBER_WORDS) + DISTANCE_WORDS
+    return KaldiRecognizer(vosk_model, SAMPLE_RATE, build_grammar(phrases))
+
+recognizer = make_recognizer()
+asr = AsrWorker(recognizer, early_phrases={p: k for k in EARLY_INTENTS for p in intent_examples[k]})
 
 #Gesture Model
-gesture_model = joblib.load("gesture_knn_model.pkl")
+gesture_predictor = GesturePredictor("gesture_knn_model.pkl")
+gesture_tracker = GestureTracker(gesture_predictor, window=5, min_votes=4)
 mp_hands = mp.solutions.hands
 hands = mp_hands.Hands(min_detection_confidence=0.7, min_tracking_confidence=0.7, max_num_hands=2)
 mp_draw = mp.solutions.drawing_utils
+landmark_extractor = LandmarkExtractor()
+perception = PerceptionMode(scale=PERCEPTION_SCALE, target_loop=TARGET_LOOP_TIME)
 
-#Learning Trick
-learning_mode = False
-learned_trick_name = None
-learned_trick_actions = []
-saved_tricks = {}
-
+#Learned tricks, read from TRICKS_FILE in the background
+trick_store = TrickStore(TRICKS_FILE, model=f"{INTENT_MODEL_NAME}:{INTENT_BACKEND}")
 
-#Util
-def audio_callback(indata, _frames, _time, status):
-    if status:
-        print("Audio error:", status)
-    audio_q.put(bytes(indata))
 
 #Multiranger, checks if blocked path
-#Treat None as infinite distance
-handle_range_measurement = lambda r: r if r is not None else float('inf')
-def can_execute(command, move, multiranger, safety_margin=0.05):
+#Out of range readings are infinite distance. The move has to end at least MIN_CLEARANCE from
+#the obstacle, otherwise the safety monitor would abort it on the way
+def can_execute(command, move, telemetry, safety_margin=MIN_CLEARANCE):
     dist = move or 0.3
-    front = handle_range_measurement(multiranger.front)
-    back  = handle_range_measurement(multiranger.back)
-    left  = handle_range_measurement(multiranger.left)
-    right = handle_range_measurement(multiranger.right)
-    up    = handle_range_measurement(multiranger.up)
+    ranges = telemetry.latest()  # one consistent snapshot for all directions
+    front, back, left, right, up = ranges.front, ranges.back, ranges.left, ranges.right, ranges.up
 
     print(f"[can_execute] cmd={command!r}, dist={dist:.2f}, "
           f"   front={front:.2f}, back={back:.2f}, left={left:.2f}, right={right:.2f}, up={up:.2f}")
-    if command == "forward":
+    if telemetry.is_stale(ranges) and command in ("forward", "back", "left", "right", "up"):
+        print(f"[can_execute] range readings are {ranges.age():.1f}s old (link stalled?), not moving")
+        ok = False
+    elif command == "forward":
         ok = front >= dist + safety_margin
     elif command == "back":
         ok = back  >= dist + safety_margin
@@ -96,78 +111,54 @@ def can_execute(command, move, multiranger, safety_margin=0.05):
     return ok
 
 
+#can_execute for a compiled trick step, a folded move needs room along every axis it moves on
+def step_is_clear(step, telemetry):
+    if isinstance(step, TrickMove):
+        return all(can_execute(move, dist, telemetry) for move, dist in step.moves)
+    return can_execute(step, None, telemetry)
+
+
 def extract_distance(text):
-    word_to_number = {
-        "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
-        "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
-        "half": 0.5, "quarter": 0.25
-    }
     match = re.search(r'\b(\d+(\.\d+)?)\b', text)
     if match:
         return float(match.group(1))
-    for word, number in word_to_number.items():
+    for word, number in NUMBER_WORDS.items():
         if word in text.lower():
             return float(number)
     return None
 
-def local_ai_intent(text):
-    #Sentence embedding
-    embedding = intent_model.encode(text)
-    #cosine similarities
-    sim = util.cos_sim(embedding, example_embeddings)[0]
-    idx = int(sim.argmax())
-    confidence = float(sim[idx])
-    best_intent = intent_labels[idx]
-    print(f"Intent match: {best_intent} ({confidence:.2f})")
-    #Keyword override
-    keywords = ["forward", "back", "left", "right", "up", "down", "spin", "shake"]
-    for kw in keywords:
-        if kw in text:
-            print(f"Keyword override: '{kw}' detected in text")
-            return kw
-    return best_intent if confidence > 0.50 else None
-
-def extract_landmarks(result):
-    landmarks = []
-    if result.multi_hand_landmarks:
-        for hand in result.multi_hand_landmarks:
-            base = hand.landmark[0]
-            ref = hand.landmark[12]
-            scale = math.dist((base.x, base.y, base.z), (ref.x, ref.y, ref.z)) or 1e-6
-            for lm in hand.landmark:
-                landmarks.extend([
-                    (lm.x - base.x) / scale,
-                    (lm.y - base.y) / scale,
-                    (lm.z - base.z) / scale
-                ])
-    while len(landmarks) < 126:
-        landmarks.append(0.0)
-    return landmarks
-
-
-def perform_command(command, commander, current_pos, taken_off, move=0.3):
+#Multiranger side a translation command flies toward
+MOVE_SIDES = {"forward": "front", "back": "back", "left": "left", "right": "right", "up": "up"}
+
+
+#Fly an animation or trick from trajectory memory when possible, setpoint by setpoint otherwise
+def as_trajectory(maneuver, pos, trajectories):
+    if trajectories is None or maneuver is None:
+        return maneuver
+    return trajectories.compiled(maneuver, pos) or maneuver
+
+
+#Estimated position from the range log, None if there is none or it is stale
+def estimated_position(telemetry):
+    ranges = telemetry.latest()
+    return None if ranges.position is None or telemetry.is_stale(ranges) else list(ranges.position)
+
+
+#position is the estimated position, used by stop to hold where the drone actually is
+def perform_command(command, scheduler, current_pos, taken_off, move=0.3, trajectories=None, position=None):
     if not move:
         move = 0.3  # fallback
     if command == "takeoff" and not taken_off:
         print("Taking off")
-        #Smooth ascend in small increments for stability
-        target_z = current_pos[2]
-        total_duration = 3.0  #total ascent time
-        steps = 6
-        step_duration = total_duration / steps
-        for i in range(1, steps + 1):
-            z = target_z * (i / steps)
-            commander.go_to(current_pos[0], current_pos[1], z, 0.0, step_duration)
-            time.sleep(step_duration)
-        time.sleep(1.0)
+        scheduler.start(takeoff_ramp(current_pos))
         taken_off = True
 
     elif command == "land" and taken_off:
         print("Landing")
-        commander.land(0.0, 2.0)
-        time.sleep(3)
+        scheduler.start(Maneuver("land").land(0.0, 2.0, wait=3))
         taken_off = False
     elif taken_off:
+        maneuver = None
         if command == "forward":
             current_pos[0] += move
             print(f"Moving forward {move:.2f}meters")
@@ -186,246 +177,476 @@ def perform_command(command, commander, current_pos, taken_off, move=0.3):
         elif command == "down":
             current_pos[2] = max(0.1, current_pos[2] - move)
             print(f"Descending {move:.2f} meters")
+        elif command == "stop":
+            #current_pos may be the target of the interrupted move, hover where the drone is
+            print("Stopping")
+            maneuver = Maneuver("stop").go_to(0.0, 0.0, 0.0, 0.0, 0.5, relative=True)
+            if position is not None:
+                current_pos = position
         elif command == "sad":
             print("Feeling sad")
-            commander.go_to(current_pos[0], current_pos[1], max(0.2, current_pos[2] - 0.3), 0.0, 2.0)
-            time.sleep(2)
-            commander.go_to(*current_pos, 0.0, 2.0)
+            maneuver = sad(current_pos)
         elif command == "shake":
             print("Shaking head")
-            commander.go_to(*current_pos, -30.0, 0.5)
-            time.sleep(0.5)
-            commander.go_to(*current_pos, 30.0, 0.5)
-            time.sleep(0.5)
-            commander.go_to(*current_pos, -30.0, 0.5)
-            time.sleep(0.5)
-            commander.go_to(*current_pos, 0.0, 0.5)
+            maneuver = shake(current_pos)
         elif command == "spin":
             print("Spinning")
-            commander.go_to(*current_pos, 90.0, 2.0)
-            time.sleep(2)
-            commander.go_to(*current_pos, 180.0, 2.0)
-            time.sleep(2)
-            commander.go_to(*current_pos, -90.0, 2.0)
-            time.sleep(2)
-            commander.go_to(*current_pos, 0.0, 2.0)
+            maneuver = spin(current_pos)
         elif command == "happy":
             print("Happy wiggle")
-            commander.go_to(current_pos[0] - 0.1, current_pos[1], current_pos[2] + 0.2, 0.0, 1.0)
-            time.sleep(1)
-            commander.go_to(current_pos[0] + 0.2, current_pos[1], current_pos[2], 0.0, 1.0)
-            time.sleep(1)
-            commander.go_to(*current_pos, 0.0, 1.0)
+            maneuver = happy(current_pos)
         elif command == "excited":
             print("Excited jump!")
-            commander.go_to(current_pos[0], current_pos[1], current_pos[2] + 0.4, 0.0, 1.0)
-            time.sleep(1)
-            commander.go_to(*current_pos, 0.0, 1.0)
+            maneuver = excited(current_pos)
         else:
             print(f"Executing '{command}'")
         current_pos = clamp(current_pos)
-        commander.go_to(*current_pos, 0.0, 2.0)
+        #animations already end back at current_pos, translations watch the side they move toward
+        watch = (MOVE_SIDES[command],) if command in MOVE_SIDES else ()
+        maneuver = as_trajectory(maneuver, current_pos, trajectories)
+        scheduler.start(maneuver or Maneuver(command, watch=watch).go_to(*current_pos, 0.0, 2.0))
     return current_pos, taken_off
 
 #stay within a box
 def clamp(pos):
     return [max(-1.5, min(1.5, pos[0])), max(-1.5, min(1.5, pos[1])), max(0.1, min(1.5, pos[2]))]
 
-#check if drone is stable when on the ground
-def wait_for_position_estimator(scf):
-    log_conf = LogConfig(name='Kalman', period_in_ms=500)
+#check if drone is stable when on the ground: the Kalman position variances have
+#settled (max - min over the window below threshold), the height estimate is sane and the
+#drone is level. Returns the time it took in seconds, raises RuntimeError on timeout
+def wait_for_position_estimator(scf, period_ms=100, window=10, threshold=0.001, timeout=10.0):
+    log_conf = LogConfig(name='Kalman', period_in_ms=period_ms)
+    for axis in "XYZ":
+        log_conf.add_variable(f'kalman.varP{axis}', 'float')
     log_conf.add_variable('kalman.stateZ', 'float')
     log_conf.add_variable('stabilizer.roll', 'float')
+    history = {axis: deque(maxlen=window) for axis in "XYZ"}
+    start = time.perf_counter()
     with SyncLogger(scf, log_conf) as logger:
-        stable = 0
         for entry in logger:
+            elapsed = time.perf_counter() - start
+            for axis in "XYZ":
+                history[axis].append(entry[1][f'kalman.varP{axis}'])
             z = entry[1]['kalman.stateZ']
             roll = abs(entry[1]['stabilizer.roll'])
-            print(f"Waiting... Z={z:.2f} | Roll={roll:.2f}")
-            if 0.00 < z < 2.0 and roll < 20:
-                stable += 1
+            if len(history["X"]) == window:
+                spread = max(max(h) - min(h) for h in history.values())
+                if spread < threshold and 0.00 < z < 2.0 and roll < 20:
+                    print(f"Position estimator ready after {elapsed:.2f}s (variance spread {spread:.5f}, Z={z:.2f})")
+                    return elapsed
+            if elapsed > timeout:
+                raise RuntimeError(f"Position estimator did not converge within {timeout:.0f}s "
+                                   f"(Z={z:.2f}, roll={roll:.2f}), not taking off")
+
+def predict_gesture(result):
+    landmarks = landmark_extractor.extract(result)
+    try:
+        #only gestures that are stable over the last frames come out of the tracker
+        gesture = gesture_tracker.update(landmarks, landmark_extractor.num_hands)
+        if gesture:
+            print(f"Gesture recognized: {gesture} ({gesture_predictor.last_latency * 1000:.1f} ms)")
+        return gesture
+    except Exception as e:
+        print("Gesture prediction error:", e)
+        return None
+
+
+#State shared by the decision and actuation stages
+class PetState:
+    def __init__(self):
+        self.current_pos = list(HOVER_POS) # position of drone after takeoff
+        self.taken_off = False
+        self.last_action = 0
+        self.idle_check = time.time() + 5
+        self.last_interaction = time.time()
+        self.mood = "neutral"
+        self.last_command = None
+        #Learning trick
+        self.learning_mode = False
+        self.learned_trick_name = None
+        self.learned_trick_actions = []
+        #intent already fired from a partial result of the current utterance
+        self.early_intent = None
+        #remaining steps of the learned trick being performed
+        self.pending_steps = []
+        self.next_step_at = 0
+        #latest command that came in while a maneuver or trick was running, run once it is done
+        self.held_command = None
+        #per-stage iterations and busy time, filled in when the pipeline stops
+        self.stage_stats = {}
+
+
+#Commands that pre-empt a running maneuver instead of waiting for it
+EMERGENCY_COMMANDS = ("stop", "land")
+
+
+#Pipeline stages, each one runs in its own thread
+#camera -> grabber -> hands -> gesture_q ──┐
+#mic -> asr.audio_q -> asr -> text_q ──────┴-> decision -> command_q -> actuation
+def hands_stage(camera, gesture_q, preview_q):
+    frame = camera.read_latest()
+    if frame is None:
+        return
+    result = None
+    if perception.should_process():
+        start = time.perf_counter()
+        #landmarks are normalized, so they still line up with the full size frame
+        rgb = perception.prepare(frame)
+        result = hands.process(rgb)
+        perception.record(time.perf_counter() - start, bool(result.multi_hand_landmarks))
+        gesture = predict_gesture(result)
+        if gesture:
+            gesture_q.put_latest(gesture)
+    if preview_q is not None:
+        preview_q.put_latest((frame, result))
+
+
+#Make a learned trick's name recognizable, reusing the stored embedding when there is one
+def register_trick(name, embedding=None):
+    if name in intent_examples:
+        return embedding
+    intent_examples[name] = [name]
+    return intent_classifier.add_example(name, name, embedding)
+
+
+def decision_stage(state, text_q, gesture_q, command_q):
+    #tricks read from disk since the last step
+    loaded = trick_store.take_loaded()
+    for trick in loaded:
+        embedding = register_trick(trick.name, trick.embedding)
+        if trick.embedding is None and embedding is not None:
+            #encoded with a different model, store the new embedding
+            trick_store.save(trick.name, trick.steps, trick.plan, trick.start, embedding)
+    if loaded and USE_GRAMMAR:
+        asr.use_recognizer(make_recognizer())
+
+    item = next_item(text_q, timeout=0.05)
+    text, early_intent = item if item else (None, None)
+    gesture = next_item(gesture_q, timeout=0)
+
+    intent, distance = None, None
+    if early_intent:
+        #trick names and steps are only taken from final results
+        if state.learning_mode:
+            return
+        print(f"Early intent: {early_intent}")
+        state.early_intent = intent = early_intent
+        text = None
+    elif item:
+        if text:
+            intent = intent_classifier.classify(text)
+            distance = extract_distance(text)
+        #de-duplicate the final result of an utterance that already fired
+        if intent and intent == state.early_intent:
+            print(f"'{intent}' already handled from the partial result")
+            intent = None
+        state.early_intent = None
+    command = intent or gesture
+    if command:
+        state.last_command = command
+
+    #learning trick/series of commands
+    if intent == "learn_trick":
+        print("Entering learning mode. Say the name of the new trick.")
+        state.learning_mode = True
+        state.learned_trick_name = None
+        state.learned_trick_actions = []
+        #the trick name can be any words, so listen with the full vocabulary
+        if USE_GRAMMAR:
+            asr.use_recognizer(make_recognizer(grammar=False))
+        return
+
+    #capture trick name
+    if state.learning_mode and not state.learned_trick_name and text:
+        state.learned_trick_name = text.strip().lower()
+        if USE_GRAMMAR:
+            asr.use_recognizer(make_recognizer())
+        print(f"Trick will be saved as: '{state.learned_trick_name}'")
+        print("Now perform a series of commands. Say 'end trick' to finish.")
+        return
+
+    #end learning mode
+    if state.learning_mode and intent == "end_trick":
+        name, actions = state.learned_trick_name, state.learned_trick_actions
+        if name and actions:
+            print(f"Trick '{name}' saved with {len(actions)} steps.")
+            start = list(HOVER_POS)
+            plan, _, clamped = compile_trick(actions, start, clamp)
+            print(f"Trick '{name}' compiles to {len(plan)} moves")
+            if clamped:
+                print(f"Warning: steps {', '.join(str(i + 1) for i in clamped)} of '{name}' hit the flight box "
+                      f"when flown from the hover position")
+
+            #add to intent detection logic
+            is_new = name not in intent_examples
+            previous = trick_store.get(name)
+            embedding = register_trick(name, previous.embedding if previous else None)
+            if is_new and USE_GRAMMAR:
+                asr.use_recognizer(make_recognizer())
+
+            #saved in memory now, appended to TRICKS_FILE by the tricks stage
+            trick_store.save(name, actions, plan, start, embedding)
+        else:
+            print("No trick name or steps to save.")
+
+        state.learning_mode = False
+        state.learned_trick_name = None
+        state.learned_trick_actions = []
+        return
+
+    #record trick actions
+    if state.learning_mode and intent and intent != "end_trick":
+        print(f"Saving step: '{intent}'")
+        state.learned_trick_actions.append(intent)
+        return
+
+    if command:
+        command_q.put_latest((command, distance))
+
+
+def actuation_stage(state, command_q, scheduler, telemetry, monitor, trajectories=None, cooldown=3, tick=0.02):
+    item = next_item(command_q, timeout=tick)
+    command, distance = item if item else (None, None)
+
+    #obstacle closer than the clearance while flying: the monitor already pre-empted the
+    #maneuver and backed off, drop the rest of the trick and track where the drone went
+    if monitor.check():
+        state.pending_steps = []
+        if monitor.retreat_target:
+            state.current_pos = list(monitor.retreat_target)
+
+    #stop/land pre-empt the running maneuver, any remaining trick steps and held commands
+    if command in EMERGENCY_COMMANDS:
+        scheduler.preempt()
+        state.pending_steps = []
+        state.held_command = None
+
+    finished = scheduler.tick()
+    now = time.time()
+    if finished and state.pending_steps:
+        state.next_step_at = now + cooldown
+    idle = not scheduler.busy() and not state.pending_steps
+
+    #other commands wait for the running maneuver, the latest one wins
+    if command and command not in EMERGENCY_COMMANDS and not idle:
+        if state.held_command is None or state.held_command[0] != command:
+            print(f"Holding '{command}' until the current maneuver is done")
+        state.held_command = (command, distance)
+        command = None
+    elif not command and state.held_command and idle and now - state.last_action > cooldown:
+        command, distance = state.held_command
+        state.held_command = None
+
+    learned = trick_store.get(command) if command else None
+    if learned and idle:
+        print(f"Performing learned trick: '{command}'")
+        #the stored plan was compiled from the hover position
+        if learned.start == state.current_pos:
+            plan = learned.plan
+        else:
+            plan, _, _ = compile_trick(learned.steps, state.current_pos, clamp)
+        #the whole trick as one uploaded trajectory when every step has room (nothing checks the
+        #steps again while it flies), step by step otherwise
+        if state.taken_off and plan and all(step_is_clear(step, telemetry) for step in plan):
+            maneuver, end_pos = trick(command, plan, state.current_pos)
+            compiled = as_trajectory(maneuver, state.current_pos, trajectories)
+            if compiled is not None and compiled is not maneuver:
+                scheduler.start(compiled)
+                state.current_pos = end_pos
+                state.last_action = state.last_interaction = now
+                return
+        #folded translations and dropped no-ops still save commands and cooldowns
+        state.pending_steps = plan
+        state.next_step_at = now
+        return
+
+    #next trick step, once the previous one finished and the cooldown is over
+    if state.pending_steps and not scheduler.busy() and now >= state.next_step_at:
+        step = state.pending_steps.pop(0)
+        #moves need the drone in the air (perform_command ignores them too)
+        if isinstance(step, TrickMove) and not state.taken_off:
+            print(f"Skipping step: {', '.join(move for move, _ in step.moves)} – not flying")
+            return
+        #safety check for this step
+        ok = step_is_clear(step, telemetry)
+        if ok and isinstance(step, TrickMove):
+            print(f"Executing step: {', '.join(f'{move} {dist:.2f}m' for move, dist in step.moves)}")
+            watch = tuple(MOVE_SIDES[move] for move, _ in step.moves if move in MOVE_SIDES)
+            duration = max(2.0, math.dist(state.current_pos, step.target) / 0.15)
+            state.current_pos = list(step.target)
+            scheduler.start(Maneuver("trick move", watch=watch).go_to(*state.current_pos, 0.0, duration))
+            state.last_action = state.last_interaction = now
+        elif ok:
+            print(f"Executing step: {step}")
+            state.current_pos, state.taken_off = perform_command(
+                step, scheduler, state.current_pos, state.taken_off, trajectories=trajectories,
+                position=estimated_position(telemetry)
+            )
+            # update cooldown/timeouts
+            state.last_action = now
+            state.last_interaction = now
+        else:
+            print(f"Blocked step '{step}' – not enough space")
+            state.pending_steps = []  #abort the rest of the trick
+        return
+
+    if command and (command in EMERGENCY_COMMANDS or (idle and now - state.last_action > cooldown)):
+        #safety/obstacle check
+        if can_execute(command, distance, telemetry):
+            print(f"Executing '{command}' (move={distance})")
+            state.last_action = now
+            state.last_interaction = now
+            state.current_pos, state.taken_off = perform_command(
+                command, scheduler, state.current_pos, state.taken_off, move=distance, trajectories=trajectories,
+                position=estimated_position(telemetry)
+            )
+            if command in ("happy", "sad", "excited"):
+                state.mood = command
+                print(f"Mood changed to: {state.mood}")
+            elif command in ("forward", "back", "left", "right", "up", "down", "spin", "shake"):
+                state.mood = "neutral"
+        else:
+            print(f"Not enough space to execute '{command}'")
+
+    #idle mood
+    if state.taken_off and idle and time.time() > state.idle_check:
+        state.idle_check = time.time() + 5
+        idle_time = time.time() - state.last_interaction
+
+        #20s of silence → bored (from neutral or happy)
+        if idle_time > 20 and state.mood in ("happy"):
+            state.mood = "bored"
+            print("Feeling bored…")
+
+        #40s of silence → sad (from bored or neutral, just in case)
+        elif idle_time > 40 and state.mood in ("bored"):
+            state.mood = "sad"
+            print("Feeling ignored…")
+
+        if state.mood == "bored":
+            scheduler.start(as_trajectory(spin(state.current_pos, "bored"), state.current_pos, trajectories))
+        elif state.mood == "sad":
+            scheduler.start(as_trajectory(droop(state.current_pos), state.current_pos, trajectories))
+
+
+def draw_preview(state, frame, result):
+    if result and result.multi_hand_landmarks:
+        for hand in result.multi_hand_landmarks:
+            mp_draw.draw_landmarks(frame, hand, mp_hands.HAND_CONNECTIONS)
+    cv2.putText(frame, f"Command: {state.last_command or 'None'}", (10, 40),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
+    cv2.putText(frame, f"{perception.fps:.0f} fps, hands {perception.inference_time * 1000:.0f} ms", (10, 75),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 1)
+    cv2.imshow("Gesture + Voice", frame)
+
+
+#Full rate preview, runs on the main thread
+def show_preview(state, preview_q):
+    item = next_item(preview_q)
+    if item is None:
+        return True
+    draw_preview(state, *item)
+    return not (cv2.waitKey(10) & 0xFF == ord('q'))
+
+
+#Low rate preview, runs as its own stage so rendering never throttles perception
+def low_rate_preview_stage(state, preview_q, stop_event, period):
+    if stop_event.wait(period):
+        return
+    item = next_item(preview_q, timeout=0)
+    if item is not None:
+        draw_preview(state, *item)
+    cv2.waitKey(1)
+
+
+#queue_class lets the replay harness time the hand-offs between stages
+def run(commander, telemetry, cap, preview=PREVIEW, trajectories=None, queue_class=LatestQueue):
+    state = PetState()
+    stop_event = threading.Event()
+    camera = CameraGrabber(cap, stop_event)
+    gesture_q, preview_q = queue_class(1, "gesture"), queue_class(1, "preview")
+    text_q, command_q = queue_class(4, "text"), queue_class(1, "command")
+    scheduler = ManeuverScheduler(commander)
+    monitor = SafetyMonitor(telemetry, scheduler, min_clearance=MIN_CLEARANCE, bounds=clamp)
+
+    #Ctrl+C / SIGTERM stop the pipeline cleanly (the drone still lands in main)
+    def request_stop(signum, _frame):
+        print(f"Received signal {signum}, stopping")
+        stop_event.set()
+    previous_handlers = {sig: signal.signal(sig, request_stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+
+    steps = {
+        "camera": camera.step,
+        "hands": lambda: hands_stage(camera, gesture_q, preview_q if preview != "headless" else None),
+        "asr": lambda: asr.step(text_q),
+        "decision": lambda: decision_stage(state, text_q, gesture_q, command_q),
+        "tricks": trick_store.step,
+        "actuation": lambda: actuation_stage(state, command_q, scheduler, telemetry, monitor, trajectories),
+    }
+    if preview == "low":
+        steps["preview"] = lambda: low_rate_preview_stage(state, preview_q, stop_event, 1 / PREVIEW_HZ)
+    stages = start_stages(stop_event, steps)
+    try:
+        while not stop_event.is_set():
+            if preview == "full":
+                if not show_preview(state, preview_q):
+                    break
             else:
-                stable = 0
-            if stable > 5:
-                break
+                stop_event.wait(0.2)
+    finally:
+        state.stage_stats = stop_stages(stop_event, stages)
+        trick_store.flush()
+        for sig, handler in previous_handlers.items():
+            signal.signal(sig, handler)
+        if preview != "headless":
+            cv2.destroyAllWindows()
+        print(f"[pipeline] {asr.stats()}")
+        print(f"[pipeline] {intent_classifier.stats()}")
+        print(f"[pipeline] {gesture_predictor.stats()}")
+        print(f"[pipeline] {gesture_tracker.stats()}")
+        print(f"[pipeline] {camera.stats()}")
+        print(f"[pipeline] {perception.stats()}")
+        print(f"[pipeline] {telemetry.stats()}")
+        print(f"[pipeline] {monitor.stats()}")
+        print(f"[pipeline] {trick_store.stats()}")
+        if trajectories:
+            print(f"[pipeline] {trajectories.stats()}")
+    return state
+
 
 #main
-with SyncCrazyflie(URI, cf=Crazyflie(rw_cache=None)) as scf:
-    with Multiranger(scf) as multiranger:
-        commander: HighLevelCommander = scf.cf.high_level_commander
-        wait_for_position_estimator(scf)
-        print("Ready!")
-
-        cap = cv2.VideoCapture(0)
-        current_pos = [0.0, 0.0, 0.5] # position of drone after takeoff
-        taken_off = False
-        cooldown = 3 #cooldown between each command
-        last_action = 0
-        idle_check = time.time() + 5
-        last_interaction = time.time()
-        mood = "neutral"
-
-        with sd.RawInputStream(samplerate=16000, blocksize=8000, dtype='int16', channels=1, callback=audio_callback):
-            try:
-                while cap.isOpened():
-                    #read sensors of multiranger
-                    front = handle_range_measurement(multiranger.front)
-                    back = handle_range_measurement(multiranger.back)
-                    left = handle_range_measurement(multiranger.left)
-                    right = handle_range_measurement(multiranger.right)
-                    up = handle_range_measurement(multiranger.up)
-
-                    _, frame = cap.read()
-                    frame = cv2.flip(frame, 1)
-                    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    result = hands.process(rgb)
-                    landmarks = extract_landmarks(result)
-
-                    #voice
-                    text, intent, distance = None, None, None
-                    if not audio_q.empty():
-                        data = audio_q.get()
-                        if recognizer.AcceptWaveform(data):
-                            text = json.loads(recognizer.Result()).get("text", "").lower()
-                            print(f"Heard: '{text}'")
-                            if text:
-                                intent = local_ai_intent(text)
-                                distance = extract_distance(text)
-
-                    #gesture
-                    gesture = None
-                    if sum(landmarks) != 0.0 and len(landmarks) == 126:
-                        try:
-                            cols = [f'x{i}' for i in range(126)]
-                            X_input = pd.DataFrame([landmarks], columns=cols)
-                            gesture = gesture_model.predict(X_input)[0]
-                            print("Gesture recognized:", gesture)
-                        except Exception as e:
-                            print("Gesture prediction error:", e)
-
-                    command = intent or gesture
-                    now = time.time()
-
-                    #learning trick/series of commands
-                    if intent == "learn_trick":
-                        print("Entering learning mode. Say the name of the new trick.")
-                        learning_mode = True
-                        learned_trick_name = None
-                        learned_trick_actions = []
-                        continue
-
-                    #capture trick name
-                    if learning_mode and not learned_trick_name and text:
-                        learned_trick_name = text.strip().lower()
-                        print(f"Trick will be saved as: '{learned_trick_name}'")
-                        print("Now perform a series of commands. Say 'end trick' to finish.")
-                        continue
-
-                    #end learning mode
-                    if learning_mode and intent == "end_trick":
-                        if learned_trick_name and learned_trick_actions:
-                            print(f"Trick '{learned_trick_name}' saved with {len(learned_trick_actions)} steps.")
-
-                            #save to runtime dictionary
-                            saved_tricks[learned_trick_name] = learned_trick_actions.copy()
-
-                            #add to intent detection logic
-                            if learned_trick_name not in intent_examples:
-                                intent_examples[learned_trick_name] = [learned_trick_name]
-                                flat_examples.append(learned_trick_name)
-                                intent_labels.append(learned_trick_name)
-                                example_embeddings = intent_model.encode(flat_examples)
-                        else:
-                            print("No trick name or steps to save.")
-
-                        learning_mode = False
-                        learned_trick_name = None
-                        learned_trick_actions = []
-                        continue
-
-                    #record trick actions
-                    if learning_mode and intent and intent != "end_trick":
-                        print(f"Saving step: '{intent}'")
-                        learned_trick_actions.append(intent)
-                        continue
-
-                    if command in saved_tricks:
-                        print(f"Performing learned trick: '{command}'")
-                        for step in saved_tricks[command]:
-                            #safety check for this step
-                            if can_execute(step, None, multiranger):
-                                print(f"Executing step: {step}")
-                                current_pos, taken_off = perform_command(
-                                    step, commander, current_pos, taken_off
-                                )
-                                # update cooldown/timeouts
-                                last_action = time.time()
-                                last_interaction = time.time()
-                                time.sleep(cooldown)
-                            else:
-                                print(f"Blocked step '{step}' – not enough space")
-                                break  #abort the rest of the trick
-                        continue
-
-                    if command and now - last_action > cooldown:
-                        #safety/obstacle check
-                        if can_execute(command, distance, multiranger):
-                            print(f"Executing '{command}' (move={distance})")
-                            last_action = now
-                            last_interaction = now
-                            current_pos, taken_off = perform_command(command, commander, current_pos, taken_off, move=distance)
-                            if command in ("happy", "sad", "excited"):
-                                mood = command
-                                print(f"Mood changed to: {mood}")
-                            elif command in ("forward", "back", "left", "right", "up", "down", "spin", "shake"):
-                                mood = "neutral"
-                        else:
-                            print(f"Not enough space to execute '{command}'")
-
-                    #idle mood
-                    if taken_off and time.time() > idle_check:
-                        idle_check = time.time() + 5
-                        idle_time = time.time() - last_interaction
-
-                        #20s of silence → bored (from neutral or happy)
-                        if idle_time > 20 and mood in ("happy"):
-                            mood = "bored"
-                            print("Feeling bored…")
-
-                        #40s of silence → sad (from bored or neutral, just in case)
-                        elif idle_time > 40 and mood in ("bored"):
-                            mood = "sad"
-                            print("Feeling ignored…")
-
-                        if mood == "bored":
-                            commander.go_to(*current_pos, 90.0, 2.0)
-                            time.sleep(2)
-                            commander.go_to(*current_pos, 180.0, 2.0)
-                            time.sleep(2)
-                            commander.go_to(*current_pos, -90.0, 2.0)
-                            time.sleep(2)
-                            commander.go_to(*current_pos, 0.0, 2.0)
-                        elif mood == "sad":
-                            commander.go_to(current_pos[0],
-                                            current_pos[1],
-                                            max(0.1, current_pos[2] - 0.2),
-                                            0.0, 1.0)
-                            time.sleep(1)
-                            commander.go_to(*current_pos, 0.0, 1.0)
-
-                    if result.multi_hand_landmarks:
-                        for hand in result.multi_hand_landmarks:
-                            mp_draw.draw_landmarks(frame, hand, mp_hands.HAND_CONNECTIONS)
-                    cv2.putText(frame, f"Command: {command or 'None'}", (10, 40),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
-                    cv2.imshow("Gesture + Voice", frame)
-                    if cv2.waitKey(10) & 0xFF == ord('q'):
-                        break
-            finally:
-                cap.release()
-                cv2.destroyAllWindows()
-                if taken_off:
-                    commander.land(0.0, 2.0)
-                    time.sleep(3)
-                scf.__exit__(None, None, None)
-                print("Landed & Disconnected")
+def main():
+    parser = argparse.ArgumentParser(description="Crazyflie interactive pet")
+    parser.add_argument("--preview", choices=("full", "low", "headless"), default=PREVIEW,
+                        help=f"camera preview: every frame, {PREVIEW_HZ} Hz in its own thread, or none")
+    parser.add_argument("--toc-cache", default=TOC_CACHE_DIR, metavar="DIR",
+                        help="directory for cached log/param TOCs, 'none' to download them on every start")
+    args = parser.parse_args()
+
+    init_drivers()
+    timings = ConnectionTimings()
+    cache_dir = None if args.toc_cache.lower() == "none" else args.toc_cache
+    with open_crazyflie(URI, cache_dir, timings) as scf:
+        with RangeTelemetry(scf.cf, period_ms=RANGE_PERIOD_MS) as telemetry:
+            commander: HighLevelCommander = scf.cf.high_level_commander
+            wait_for_position_estimator(scf)
+            timings.mark("estimator")
+            print("Ready!")
+            print(f"[startup] {timings.stats()}")
+            trajectories = TrajectoryLibrary(commander, trajectory_memory(scf.cf)) if USE_TRAJECTORIES else None
+
+            cap = cv2.VideoCapture(0)
+            state = None
+            with sd.RawInputStream(samplerate=SAMPLE_RATE, blocksize=BLOCK_SIZE, dtype='int16', channels=1, callback=asr.audio_callback):
+                try:
+                    state = run(commander, telemetry, cap, preview=args.preview, trajectories=trajectories)
+                finally:
+                    cap.release()
+                    if state is None or state.taken_off:
+                        commander.land(0.0, 2.0)
+                        time.sleep(3)
+                    print("Landed & Disconnected")
+
+
+if __name__ == "__main__":
+    main()
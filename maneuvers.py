@@ -0,0 +1,205 @@
+import math, time
+from collections import namedtuple
+
+
+ALL_SIDES = ("front", "back", "left", "right", "up")
+
+
+#A maneuver is a timed list of setpoints (at, kind, args) sent to the HighLevelCommander,
+#`at` is the offset in seconds from the start of the maneuver.
+#watch lists the Multiranger sides the safety monitor checks while it flies.
+class Maneuver:
+    def __init__(self, name, watch=()):
+        self.name = name
+        self.watch = watch
+        self.setpoints = []
+        self.duration = 0.0
+
+    #wait defaults to the duration of the move (same as go_to + time.sleep)
+    def go_to(self, x, y, z, yaw, duration, wait=None, relative=False):
+        args = (x, y, z, yaw, duration, True) if relative else (x, y, z, yaw, duration)
+        self.setpoints.append((self.duration, "go_to", args))
+        self.duration += duration if wait is None else wait
+        return self
+
+    def land(self, z, duration, wait=None):
+        self.setpoints.append((self.duration, "land", (z, duration)))
+        self.duration += duration if wait is None else wait
+        return self
+
+    def pause(self, seconds):
+        self.duration += seconds
+        return self
+
+    #Runs a trajectory already uploaded to the Crazyflie (see trajectory.py), shifted to start
+    #at the current setpoint
+    def start_trajectory(self, trajectory_id, duration, time_scale=1.0):
+        self.setpoints.append((self.duration, "start_trajectory", (trajectory_id, time_scale, True)))
+        self.duration += duration * time_scale
+        return self
+
+    #Append the setpoints of another maneuver after this one
+    def then(self, other):
+        offset = self.duration
+        self.setpoints.extend((offset + at, kind, args) for at, kind, args in other.setpoints)
+        self.duration += other.duration
+        return self
+
+    def __repr__(self):
+        return f"Maneuver({self.name!r}, {len(self.setpoints)} setpoints, {self.duration:.1f}s)"
+
+
+#Advances one maneuver at a time from tick(), can be pre-empted between any two setpoints
+class ManeuverScheduler:
+    def __init__(self, commander):
+        self.commander = commander
+        self.current = None
+        self.started = 0.0
+        self.next_index = 0
+
+    def start(self, maneuver, now=None):
+        if self.current:
+            self.preempt()
+        self.current = maneuver
+        self.started = time.monotonic() if now is None else now
+        self.next_index = 0
+        self.tick(self.started)
+
+    def busy(self):
+        return self.current is not None
+
+    #Send every setpoint that is due, returns the maneuver that just finished (if any)
+    def tick(self, now=None):
+        if not self.current:
+            return None
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.started
+        setpoints = self.current.setpoints
+        while self.next_index < len(setpoints) and setpoints[self.next_index][0] <= elapsed:
+            _, kind, args = setpoints[self.next_index]
+            getattr(self.commander, kind)(*args)
+            self.next_index += 1
+        if self.next_index >= len(setpoints) and elapsed >= self.current.duration:
+            finished, self.current = self.current, None
+            return finished
+        return None
+
+    #Drop the remaining setpoints, returns the interrupted maneuver
+    def preempt(self):
+        interrupted, self.current = self.current, None
+        if interrupted:
+            print(f"Pre-empted '{interrupted.name}' after {self.next_index}/{len(interrupted.setpoints)} setpoints")
+        return interrupted
+
+
+#Built-in animations, pos is the position the drone returns to
+def takeoff_ramp(pos, total_duration=3.0, steps=6):
+    #Smooth ascend in small increments for stability
+    maneuver = Maneuver("takeoff", watch=("up",))
+    step_duration = total_duration / steps
+    for i in range(1, steps + 1):
+        maneuver.go_to(pos[0], pos[1], pos[2] * (i / steps), 0.0, step_duration)
+    return maneuver.pause(1.0)
+
+
+def sad(pos):
+    return (Maneuver("sad", watch=ALL_SIDES)
+            .go_to(pos[0], pos[1], max(0.2, pos[2] - 0.3), 0.0, 2.0)
+            .go_to(*pos, 0.0, 2.0))
+
+
+def shake(pos):
+    return (Maneuver("shake", watch=ALL_SIDES)
+            .go_to(*pos, -30.0, 0.5)
+            .go_to(*pos, 30.0, 0.5)
+            .go_to(*pos, -30.0, 0.5)
+            .go_to(*pos, 0.0, 0.5))
+
+
+def spin(pos, name="spin"):
+    return (Maneuver(name, watch=ALL_SIDES)
+            .go_to(*pos, 90.0, 2.0)
+            .go_to(*pos, 180.0, 2.0)
+            .go_to(*pos, -90.0, 2.0)
+            .go_to(*pos, 0.0, 2.0))
+
+
+def happy(pos):
+    return (Maneuver("happy", watch=ALL_SIDES)
+            .go_to(pos[0] - 0.1, pos[1], pos[2] + 0.2, 0.0, 1.0)
+            .go_to(pos[0] + 0.2, pos[1], pos[2], 0.0, 1.0)
+            .go_to(*pos, 0.0, 1.0))
+
+
+def excited(pos):
+    return (Maneuver("excited", watch=ALL_SIDES)
+            .go_to(pos[0], pos[1], pos[2] + 0.4, 0.0, 1.0)
+            .go_to(*pos, 0.0, 1.0))
+
+
+def droop(pos):
+    return (Maneuver("droop", watch=ALL_SIDES)
+            .go_to(pos[0], pos[1], max(0.1, pos[2] - 0.2), 0.0, 1.0)
+            .go_to(*pos, 0.0, 1.0))
+
+
+ANIMATIONS = {"sad": sad, "shake": shake, "spin": spin, "happy": happy, "excited": excited}
+
+#Translation commands as (x, y, z) directions
+MOVES = {"forward": (1, 0, 0), "back": (-1, 0, 0), "left": (0, 1, 0), "right": (0, -1, 0),
+         "up": (0, 0, 1), "down": (0, 0, -1)}
+#(positive, negative) command along x, y and z
+AXES = (("forward", "back"), ("left", "right"), ("up", "down"))
+
+
+#A folded run of translation steps: where it ends and the (command, distance) moves it adds up to
+TrickMove = namedtuple("TrickMove", ("target", "moves"))
+
+
+#Folds a learned trick into the moves it actually makes from pos: consecutive translations become
+#one target (clamped after every step, like replaying them one by one), runs that end where they
+#started and steps that don't move the drone (stop, unknown words) are dropped without
+#breaking the run.
+#Returns (plan, end position, indexes of the steps the box clamped), plan items are
+#an animation name, "takeoff"/"land" or a TrickMove.
+def compile_trick(steps, pos, bounds, move=0.3):
+    plan, clamped = [], []
+    pos = list(pos)
+    run_start = pos
+    for i, step in enumerate(steps + [None]):
+        if step in MOVES:
+            wanted = [p + move * d for p, d in zip(pos, MOVES[step])]
+            pos = bounds(wanted)
+            if pos != wanted:
+                clamped.append(i)
+            continue
+        if step is not None and step not in ANIMATIONS and step not in ("takeoff", "land"):
+            continue
+        delta = [b - a for a, b in zip(run_start, pos)]
+        moves = [(name, abs(d)) for d, (positive, negative) in zip(delta, AXES) if abs(d) > 1e-6
+                 for name in [positive if d > 0 else negative]]
+        if moves:
+            plan.append(TrickMove(tuple(pos), moves))
+        else:
+            pos = run_start  # back where the run started, up to rounding
+        if step in ANIMATIONS or step in ("takeoff", "land"):
+            plan.append(step)
+        run_start = pos
+    return plan, pos, clamped
+
+
+#A compiled trick (see compile_trick) as one maneuver, with a short pause instead of the cooldown
+#between moves. Returns (maneuver, end position), or (None, pos) if it takes off or lands
+def trick(name, plan, pos, step_pause=0.5, speed=0.15):
+    maneuver = Maneuver(name, watch=ALL_SIDES)
+    for item in plan:
+        if item in ("takeoff", "land"):
+            return None, pos
+        if isinstance(item, TrickMove):
+            distance = math.dist(pos, item.target)
+            pos = list(item.target)
+            maneuver.go_to(*pos, 0.0, max(2.0, distance / speed))
+        else:
+            maneuver.then(ANIMATIONS[item](pos))
+        maneuver.pause(step_pause)
+    return maneuver, pos
@@ -0,0 +1,59 @@
+import math, time
+import cv2
+import numpy as np
+
+
+#Decides which camera frames go through MediaPipe Hands and at what resolution:
+#every frame while a hand is tracked, every idle_every-th frame otherwise, with
+#idle_every adapted (between min and max) so the average inference cost per frame
+#stays under target_loop
+class PerceptionMode:
+    def __init__(self, scale=0.5, target_loop=1 / 30, min_idle_every=2, max_idle_every=6):
+        self.scale = scale
+        self.target_loop = target_loop
+        self.min_idle_every = min_idle_every
+        self.max_idle_every = max_idle_every
+        self.idle_every = min_idle_every
+        self.hand_present = False
+        self.frame_index = 0
+        self.processed = 0
+        self.fps = 0.0
+        self.inference_time = 0.0  # moving average, seconds
+        self.last_frame = None
+        self.small = None  # preallocated resize and colour conversion outputs
+        self.rgb = None
+
+    def should_process(self):
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.fps = 0.9 * self.fps + 0.1 / max(now - self.last_frame, 1e-6)
+        self.last_frame = now
+        self.frame_index += 1
+        return self.hand_present or self.frame_index % self.idle_every == 0
+
+    #Downscaled RGB copy of a BGR frame, written into buffers reused across frames
+    def prepare(self, frame):
+        if self.scale < 1.0:
+            h, w = frame.shape[:2]
+            size = (max(1, int(w * self.scale)), max(1, int(h * self.scale)))
+            if self.small is None or self.small.shape[:2] != (size[1], size[0]):
+                self.small = np.empty((size[1], size[0], 3), dtype=frame.dtype)
+            cv2.resize(frame, size, dst=self.small, interpolation=cv2.INTER_AREA)
+            frame = self.small
+        if self.rgb is None or self.rgb.shape != frame.shape:
+            self.rgb = np.empty_like(frame)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        return self.rgb
+
+    def record(self, inference_time, hand_present):
+        self.processed += 1
+        self.hand_present = hand_present
+        alpha = 0.1 if self.processed > 1 else 1.0
+        self.inference_time += alpha * (inference_time - self.inference_time)
+        needed = math.ceil(self.inference_time / self.target_loop)
+        self.idle_every = max(self.min_idle_every, min(self.max_idle_every, needed))
+
+    def stats(self):
+        return (f"perception: {self.fps:.1f} fps, {self.processed}/{self.frame_index} frames processed, "
+                f"{self.inference_time * 1000:.1f} ms inference at {self.scale:.2f}x, "
+                f"idle detection every {self.idle_every} frame(s)")
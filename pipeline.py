@@ -0,0 +1,75 @@
+import queue, threading, time
+
+
+#Bounded queue where new items push out the oldest ones (latest value wins)
+class LatestQueue(queue.Queue):
+    def __init__(self, maxsize=1, name=None):
+        super().__init__(maxsize)
+        self.name = name
+        self.dropped = 0
+
+    def put_latest(self, item):
+        while True:
+            try:
+                self.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+#Get the next item of a queue, None if nothing arrived in time
+def next_item(q, timeout=0.1):
+    try:
+        if not timeout:
+            return q.get_nowait()
+        return q.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+
+#One pipeline stage: runs step() in its own thread until stop_event is set
+class Stage(threading.Thread):
+    def __init__(self, name, step, stop_event):
+        super().__init__(name=name, daemon=True)
+        self.step = step
+        self.stop_event = stop_event
+        self.iterations = 0
+        self.busy_time = 0.0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            try:
+                self.step()
+            except Exception as e:
+                print(f"[{self.name}] error:", e)
+            self.busy_time += time.perf_counter() - start
+            self.iterations += 1
+
+    def summary(self):
+        avg = self.busy_time / self.iterations if self.iterations else 0.0
+        return {"iterations": self.iterations, "busy_s": self.busy_time, "avg_ms": avg * 1000}
+
+    def stats(self):
+        summary = self.summary()
+        return f"{self.name}: {summary['iterations']} iterations, {summary['avg_ms']:.1f} ms avg"
+
+
+def start_stages(stop_event, steps):
+    stages = [Stage(name, step, stop_event) for name, step in steps.items()]
+    for stage in stages:
+        stage.start()
+    return stages
+
+
+#Returns the per-stage summaries, stage name -> iterations and busy time
+def stop_stages(stop_event, stages, timeout=2.0):
+    stop_event.set()
+    for stage in stages:
+        stage.join(timeout)
+        print(f"[pipeline] {stage.stats()}")
+    return {stage.name: stage.summary() for stage in stages}
@@ -1,7 +1,7 @@
 import cv2
 import mediapipe as mp
 import csv
-import math
+from gesture_features import LandmarkExtractor
 
 # === Setup MediaPipe ===
 mp_hands = mp.solutions.hands
@@ -10,6 +10,7 @@ hands = mp_hands.Hands(static_image_mode=False,
                        min_detection_confidence=0.7,
                        min_tracking_confidence=0.7)
 mp_drawing = mp.solutions.drawing_utils
+extractor = LandmarkExtractor()
 
 # === Webcam Feed ===
 cap = cv2.VideoCapture(0)
@@ -30,10 +31,6 @@ label_map = {
 current_label = None
 print("📷 Press: [t]akeoff, [l]and, [u]p, [d]own, [h]appy, [s]ad, [a]left, [r]ight — [q] to quit and save.")
 
-# === Helper to calculate distance ===
-def calc_distance(p1, p2):
-    return math.sqrt((p1.x - p2.x) ** 2 + (p1.y - p2.y) ** 2 + (p1.z - p2.z) ** 2)
-
 # === Recording Loop ===
 while cap.isOpened():
     success, frame = cap.read()
@@ -44,31 +41,15 @@ while cap.isOpened():
     rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     result = hands.process(rgb)
 
-    all_landmarks = []
-
     if result.multi_hand_landmarks:
         for hand in result.multi_hand_landmarks:
             mp_drawing.draw_landmarks(frame, hand, mp_hands.HAND_CONNECTIONS)
 
-            base = hand.landmark[0]
-            ref = hand.landmark[12]
-            scale = calc_distance(base, ref)
-            if scale == 0:
-                scale = 1e-6  # Avoid divide-by-zero
-
-            for lm in hand.landmark:
-                all_landmarks.extend([
-                    (lm.x - base.x) / scale,
-                    (lm.y - base.y) / scale,
-                    (lm.z - base.z) / scale
-                ])
-
-    # Pad to always have 2 hands × 21 landmarks = 126 values
-    while len(all_landmarks) < 126:
-        all_landmarks.append(0.0)
+    # Always 2 hands × 21 landmarks = 126 values, missing hand padded with zeros
+    all_landmarks = extractor.extract(result)
 
-    if current_label and any(all_landmarks):  # Only record if hand(s) detected
-        data.append(all_landmarks + [current_label])
+    if current_label and extractor.num_hands:  # Only record if hand(s) detected
+        data.append(all_landmarks.tolist() + [current_label])
 
     # Display current label
     cv2.putText(frame, f"Label: {current_label or 'None'}", (10, 30),
@@ -0,0 +1,353 @@
+import argparse, csv, json, os, threading, time, wave
+from collections import deque
+import cv2
+import numpy as np
+
+from pipeline import LatestQueue
+from telemetry import RangeTelemetry, RANGE_DIRECTIONS
+from asr import SAMPLE_RATE, BLOCK_SIZE
+from camera import CameraGrabber
+from maneuvers import ManeuverScheduler
+
+# === Replay a recorded session through the pipeline of main.py without the drone ===
+#Video frames, WAV audio and logged Multiranger readings are fed at their recorded pace,
+#the HighLevelCommander is replaced by a fake that records every setpoint, and the time from
+#an input entering the pipeline to the setpoint it caused is reported.
+#
+#  python replay.py --video session.mp4 --audio session.wav --ranges ranges.csv --report report.json
+#
+#ranges.csv has a header row: t (seconds from the start), front, back, left, right, up
+#(millimeters, as logged by the firmware) and optionally x, y, z (meters) and yaw (degrees).
+
+#Per-thread trace: when the input behind the item a thread is working on entered the pipeline,
+#taken from the last item that thread got from a queue
+_trace = threading.local()
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    ms = np.asarray(values) * 1000
+    return {"count": len(values), "avg_ms": float(ms.mean()), "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)), "max_ms": float(ms.max())}
+
+
+def _format(name, summary):
+    if summary is None:
+        return f"{name}: no samples"
+    return (f"{name}: {summary['count']}x, avg {summary['avg_ms']:.1f} ms, p50 {summary['p50_ms']:.1f} ms, "
+            f"p95 {summary['p95_ms']:.1f} ms, max {summary['max_ms']:.1f} ms")
+
+
+#LatestQueue that stamps every item with its origin time and records how long items wait.
+#Source queues (filled by a thread without a trace, like the audio callback) start a new trace.
+class TimedQueue(LatestQueue):
+    def __init__(self, maxsize=1, name=None, source=False):
+        super().__init__(maxsize, name)
+        self.source = source
+        self.waits = []
+
+    def put_latest(self, item):
+        #an item dropped to make room is not a hand-off, keep the trace of the putting thread
+        origin = getattr(_trace, "origin", None)
+        _trace.dropping = True
+        try:
+            super().put_latest(item)
+        finally:
+            _trace.dropping = False
+            _trace.origin = origin
+
+    def _put(self, item):
+        now = time.perf_counter()
+        origin = None if self.source else getattr(_trace, "origin", None)
+        self.queue.append((now, now if origin is None else origin, item))
+
+    #a command only counts for the maneuver started in the same actuation step
+    def get(self, block=True, timeout=None):
+        if self.name == "command" and not getattr(_trace, "dropping", False):
+            _trace.command = None
+        return super().get(block, timeout)
+
+    def _get(self):
+        put_at, origin, item = self.queue.popleft()
+        if not getattr(_trace, "dropping", False):
+            self.waits.append(time.perf_counter() - put_at)
+            _trace.origin = origin
+            if self.name == "command":
+                _trace.command = item[0]
+        return item
+
+
+#Marks the maneuver a command started (perform_command and tricks name the maneuver after the
+#command), so rejected commands, idle moods and safety retreats get no latency
+class TracedScheduler(ManeuverScheduler):
+    def start(self, maneuver, now=None):
+        _trace.starting = maneuver.name == getattr(_trace, "command", None)
+        _trace.command = None
+        try:
+            super().start(maneuver, now)
+        finally:
+            _trace.starting = False
+
+
+#CameraGrabber that starts the hands thread's trace when a frame was read from the capture.
+#A gesture needs `votes` agreeing frames in a row (every frame is processed while a hand is
+#tracked), so its origin is the oldest of the last `votes` frames: the debounce, capture and
+#MediaPipe time all count toward the latency.
+class TracedGrabber(CameraGrabber):
+    votes = 1
+
+    def __init__(self, cap, stop_event, pool_size=4):
+        super().__init__(cap, stop_event, pool_size)
+        self.handed = deque(maxlen=self.votes)
+
+    def read_latest(self, timeout=0.1):
+        frame = super().read_latest(timeout)
+        if frame is not None:
+            self.handed.append(self.cap.read_times.get(self.read_id, time.perf_counter()))
+            _trace.origin = self.handed[0]
+        return frame
+
+
+#Stands in for the HighLevelCommander (and its position estimate), records every call.
+#The first setpoint of a maneuver started by a command is attributed to that command's trace.
+class FakeCommander:
+    def __init__(self, start):
+        self.start = start
+        self.setpoints = []  # (seconds since start, end-to-end latency or None, kind, args)
+        self.position = (0.0, 0.0, 0.0)
+        self.yaw = 0.0
+
+    def _record(self, kind, args):
+        now = time.perf_counter()
+        origin = getattr(_trace, "origin", None) if getattr(_trace, "starting", False) else None
+        _trace.starting = False
+        self.setpoints.append((now - self.start, None if origin is None else now - origin, kind, args))
+
+    def go_to(self, x, y, z, yaw, duration_s, relative=False, *args):
+        self._record("go_to", (x, y, z, yaw, duration_s, relative))
+        if relative:
+            x, y, z = (p + d for p, d in zip(self.position, (x, y, z)))
+            yaw += self.yaw
+        self.position = (x, y, z)
+        self.yaw = yaw
+
+    def takeoff(self, height, duration_s, *args):
+        self._record("takeoff", (height, duration_s))
+        self.position = self.position[:2] + (height,)
+
+    def land(self, height, duration_s, *args):
+        self._record("land", (height, duration_s))
+        self.position = self.position[:2] + (height,)
+
+    def start_trajectory(self, trajectory_id, time_scale=1.0, relative=False, *args):
+        self._record("start_trajectory", (trajectory_id, time_scale, relative))
+
+    def define_trajectory(self, trajectory_id, offset, n_pieces, *args):
+        self._record("define_trajectory", (trajectory_id, offset, n_pieces))
+
+    def stop(self, *args):
+        self._record("stop", ())
+
+
+#Trajectory memory that accepts every upload
+class FakeTrajectoryMemory:
+    def __init__(self, size=4096):
+        self.size = size
+        self.trajectory = []
+        self.uploads = 0
+
+    def write_data_sync(self, start_addr=0):
+        self.uploads += 1
+        return True
+
+
+#Read time of a frame, only the last `keep` frames are kept (TracedGrabber looks up the newest)
+def _stamp(read_times, frame, keep):
+    read_times[frame] = time.perf_counter()
+    read_times.pop(frame - keep, None)
+
+
+def _sleep_until(start, offset, stop_event):
+    delay = start + offset - time.perf_counter()
+    return stop_event.wait(delay) if delay > 0 else stop_event.is_set()
+
+
+#Video file read at its own frame rate, drop-in for cv2.VideoCapture
+class ReplayCapture:
+    def __init__(self, path, start, stop_event, keep=1):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Cannot open video {path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.start = start
+        self.stop_event = stop_event
+        self.frames = 0
+        self.keep = keep
+        self.read_times = {}  # frame number (CameraGrabber.frame_id) -> when it was read
+
+    def read(self, image=None):
+        if _sleep_until(self.start, self.frames / self.fps, self.stop_event):
+            return False, image
+        ok, frame = self.cap.read(image)
+        if ok:
+            self.frames += 1
+            _stamp(self.read_times, self.frames, self.keep)
+        return ok, frame
+
+    def release(self):
+        self.cap.release()
+
+
+#Black frames for a fixed time, when only audio is replayed
+class StillCapture:
+    def __init__(self, duration, start, stop_event, fps=30.0, shape=(480, 640, 3), keep=1):
+        self.duration = duration
+        self.fps = fps
+        self.shape = shape
+        self.start = start
+        self.stop_event = stop_event
+        self.frames = 0
+        self.keep = keep
+        self.read_times = {}
+
+    def read(self, image=None):
+        if self.frames / self.fps >= self.duration or _sleep_until(self.start, self.frames / self.fps,
+                                                                   self.stop_event):
+            return False, image
+        if image is None or image.shape != self.shape:
+            image = np.zeros(self.shape, dtype=np.uint8)
+        self.frames += 1
+        _stamp(self.read_times, self.frames, self.keep)
+        return True, image
+
+    def release(self):
+        pass
+
+
+def wav_duration(path):
+    with wave.open(path, "rb") as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+#Feeds a 16 kHz mono 16-bit WAV to the ASR callback in BLOCK_SIZE chunks at recorded pace,
+#followed by a second of silence so the last utterance gets a final result
+def feed_audio(path, audio_callback, start, stop_event):
+    #chunks audio_callback drops on this thread are not hand-offs
+    _trace.dropping = True
+    with wave.open(path, "rb") as wav:
+        if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) != (SAMPLE_RATE, 1, 2):
+            print(f"[replay] {path} must be {SAMPLE_RATE} Hz mono 16-bit, not replaying audio")
+            return
+        total = wav.getnframes() + SAMPLE_RATE
+        chunk = 0
+        while chunk * BLOCK_SIZE < total:
+            data = wav.readframes(BLOCK_SIZE) or bytes(2 * BLOCK_SIZE)
+            if _sleep_until(start, (chunk + 1) * BLOCK_SIZE / SAMPLE_RATE, stop_event):
+                return
+            audio_callback(data, len(data) // 2, None, None)
+            chunk += 1
+
+
+def read_ranges(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [{key: float(value) for key, value in row.items()} for row in csv.DictReader(f)]
+
+
+#Publishes logged range rows (or nothing in range when there is no log) through
+#RangeTelemetry every period, the position and yaw come from the log or the last setpoint
+def feed_ranges(telemetry, commander, rows, start, stop_event, period=0.05):
+    index, tick = 0, 0
+    row = {d: 8000.0 for d in RANGE_DIRECTIONS}
+    while not _sleep_until(start, tick * period, stop_event):
+        elapsed = time.perf_counter() - start
+        while rows and index < len(rows) and rows[index]["t"] <= elapsed:
+            row = rows[index]
+            index += 1
+        data = {f"range.{d}": row[d] for d in RANGE_DIRECTIONS}
+        position = (row["x"], row["y"], row["z"]) if "x" in row else commander.position
+        data.update({f"stateEstimate.{axis}": value for axis, value in zip("xyz", position)})
+        data["stateEstimate.yaw"] = row.get("yaw", commander.yaw)
+        telemetry._on_data(int(elapsed * 1000), data, None)
+        tick += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded session through the pet pipeline")
+    parser.add_argument("--video", help="recorded camera video")
+    parser.add_argument("--audio", help=f"recorded microphone audio, {SAMPLE_RATE} Hz mono 16-bit WAV")
+    parser.add_argument("--ranges", help="logged Multiranger readings (CSV)")
+    parser.add_argument("--trajectories", action="store_true", help="upload animations/tricks to a fake trajectory memory")
+    parser.add_argument("--tricks", default=os.path.join("cache", "replay_tricks.jsonl"),
+                        help="trick file used instead of the real one, emptied at the start")
+    parser.add_argument("--report", help="write the latencies and setpoints as JSON")
+    args = parser.parse_args()
+    if not args.video and not args.audio:
+        parser.error("give --video and/or --audio")
+
+    import main as pet  # loads the speech, intent and gesture models
+    from tricks import TrickStore
+    from trajectory import TrajectoryLibrary
+
+    os.makedirs(os.path.dirname(args.tricks) or ".", exist_ok=True)
+    open(args.tricks, "w").close()
+    pet.trick_store = TrickStore(args.tricks, model=pet.trick_store.model)
+    pet.ManeuverScheduler = TracedScheduler
+    pet.CameraGrabber = TracedGrabber
+    TracedGrabber.votes = pet.gesture_tracker.min_votes
+
+    queues = []
+    def timed_queue(maxsize, name):
+        queues.append(TimedQueue(maxsize, name))
+        return queues[-1]
+    queues.append(TimedQueue(pet.asr.audio_q.maxsize, "audio", source=True))
+    pet.asr.audio_q = queues[0]
+
+    feed_stop = threading.Event()
+    start = time.perf_counter()
+    commander = FakeCommander(start)
+    telemetry = RangeTelemetry(cf=None, period_ms=pet.RANGE_PERIOD_MS)
+    trajectories = TrajectoryLibrary(commander, FakeTrajectoryMemory()) if args.trajectories else None
+    if args.video:
+        cap = ReplayCapture(args.video, start, feed_stop, keep=TracedGrabber.votes)
+    else:
+        cap = StillCapture(wav_duration(args.audio) + 2.0, start, feed_stop, keep=TracedGrabber.votes)
+
+    feeders = [threading.Thread(target=feed_ranges, daemon=True,
+                                args=(telemetry, commander, read_ranges(args.ranges) if args.ranges else [],
+                                      start, feed_stop, pet.RANGE_PERIOD_MS / 1000))]
+    if args.audio:
+        feeders.append(threading.Thread(target=feed_audio, daemon=True,
+                                        args=(args.audio, pet.asr.audio_callback, start, feed_stop)))
+    for feeder in feeders:
+        feeder.start()
+    try:
+        state = pet.run(commander, telemetry, cap, preview="headless", trajectories=trajectories,
+                        queue_class=timed_queue)
+    finally:
+        feed_stop.set()
+        for feeder in feeders:
+            feeder.join(1.0)
+        cap.release()
+
+    wall = time.perf_counter() - start
+    report = {
+        "duration_s": wall,
+        "stages": state.stage_stats,
+        "queue_waits": {q.name: _percentiles(q.waits) for q in queues},
+        "end_to_end": _percentiles([latency for _, latency, _, _ in commander.setpoints if latency is not None]),
+        "setpoints": [{"t": t, "latency_ms": None if latency is None else latency * 1000, "kind": kind, "args": args}
+                      for t, latency, kind, args in commander.setpoints],
+    }
+    print(f"[replay] {wall:.1f}s replayed, {len(commander.setpoints)} setpoints")
+    for name, summary in report["queue_waits"].items():
+        print(f"[replay] {_format(f'{name} queue wait', summary)}")
+    print(f"[replay] {_format('input to setpoint', report['end_to_end'])}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[replay] report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
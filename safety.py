@@ -0,0 +1,66 @@
+import math, time
+
+from maneuvers import Maneuver
+
+#Unit vector pointing toward each Multiranger side, in the drone's body frame
+SIDE_VECTORS = {"front": (1, 0, 0), "back": (-1, 0, 0), "left": (0, 1, 0), "right": (0, -1, 0), "up": (0, 0, 1)}
+
+
+#Body frame vector turned by yaw (degrees) into the world frame of the position estimate
+def to_world(vector, yaw):
+    c, s = math.cos(math.radians(yaw)), math.sin(math.radians(yaw))
+    x, y, z = vector
+    return (c * x - s * y, s * x + c * y, z)
+
+
+#Checks every new range snapshot while a maneuver flies (call check() each actuation tick).
+#When a side the maneuver watches gets closer than min_clearance, the maneuver is pre-empted
+#and the drone backs off `retreat` meters from that side, or hovers in place when no
+#position estimate is available. The time from the reading to the reaction is logged.
+class SafetyMonitor:
+    def __init__(self, telemetry, scheduler, min_clearance=0.2, retreat=0.1, bounds=None):
+        self.telemetry = telemetry
+        self.scheduler = scheduler
+        self.min_clearance = min_clearance
+        self.retreat = retreat
+        self.bounds = bounds or (lambda pos: pos)
+        self.last_checked = None
+        self.retreat_target = None  # where the last retreat flies to, None when it hovered in place
+        self.checks = 0
+        self.reaction_times = []
+
+    #Returns True when it pre-empted the running maneuver
+    def check(self):
+        maneuver = self.scheduler.current
+        ranges = self.telemetry.latest()
+        if maneuver is None or not maneuver.watch or ranges.timestamp == self.last_checked:
+            return False
+        self.last_checked = ranges.timestamp
+        self.checks += 1
+        blocked = [side for side in maneuver.watch if getattr(ranges, side) < self.min_clearance]
+        if not blocked:
+            return False
+
+        self.scheduler.preempt()
+        side = min(blocked, key=lambda s: getattr(ranges, s))
+        target = self.retreat_target = None
+        if ranges.position is not None and ranges.yaw is not None and not self.telemetry.is_stale(ranges):
+            #the rangers turn with the drone (spin, shake), the position is in the world frame
+            vector = to_world(SIDE_VECTORS[side], ranges.yaw)
+            target = self.retreat_target = self.bounds([p - self.retreat * v for p, v in zip(ranges.position, vector)])
+            self.scheduler.start(Maneuver("retreat").go_to(*target, 0.0, 1.0))
+        else:
+            self.scheduler.start(Maneuver("hover").go_to(0.0, 0.0, 0.0, 0.0, 0.5, relative=True))
+        reaction = time.monotonic() - ranges.timestamp
+        self.reaction_times.append(reaction)
+        print(f"[safety] {side} clearance {getattr(ranges, side):.2f} m < {self.min_clearance:.2f} m during "
+              f"'{maneuver.name}', {'retreating' if target else 'hovering'} {reaction * 1000:.0f} ms after the reading")
+        return True
+
+    def stats(self):
+        if not self.reaction_times:
+            return f"safety: {self.checks} checks, no interventions"
+        worst = max(self.reaction_times) * 1000
+        avg = sum(self.reaction_times) / len(self.reaction_times) * 1000
+        return (f"safety: {self.checks} checks, {len(self.reaction_times)} interventions, "
+                f"reaction {avg:.0f} ms avg / {worst:.0f} ms max")
@@ -0,0 +1,72 @@
+import time
+from collections import namedtuple
+
+from cflib.crazyflie.log import LogConfig
+
+RANGE_DIRECTIONS = ("front", "back", "left", "right", "up")
+
+
+#Latest Multiranger readings in meters (inf = nothing in range), the estimated (x, y, z)
+#position, the estimated yaw in degrees (the rangers turn with it) and when they arrived
+class RangeSnapshot(namedtuple("RangeSnapshot", RANGE_DIRECTIONS + ("position", "yaw", "timestamp"))):
+    __slots__ = ()
+
+    def age(self, now=None):
+        return (time.monotonic() if now is None else now) - self.timestamp
+
+
+NO_READINGS = RangeSnapshot(*([float("inf")] * len(RANGE_DIRECTIONS)), position=None, yaw=None,
+                            timestamp=float("-inf"))
+
+
+#Same conversion as cflib's Multiranger: mm to m, 8 m and above means out of range
+def _to_meters(mm):
+    return float("inf") if mm >= 8000 else mm / 1000.0
+
+
+#Subscribes to the range logs at period_ms and keeps the latest readings as one immutable
+#snapshot, replaced by a single reference assignment so readers never lock and always see
+#a consistent set of directions. Readings older than max_age mean the link stalled.
+class RangeTelemetry:
+    def __init__(self, cf, period_ms=50, max_age=0.5):
+        self.cf = cf
+        self.max_age = max_age
+        self.snapshot = NO_READINGS
+        self.updates = 0
+        self.log_config = LogConfig(name="Ranges", period_in_ms=period_ms)
+        for direction in RANGE_DIRECTIONS:
+            self.log_config.add_variable(f"range.{direction}", "uint16_t")
+        #5 uint16 + 4 floats, exactly the 26 bytes of one log packet
+        for axis in ("x", "y", "z", "yaw"):
+            self.log_config.add_variable(f"stateEstimate.{axis}", "float")
+        self.log_config.data_received_cb.add_callback(self._on_data)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self.cf.log.add_config(self.log_config)
+        self.log_config.start()
+
+    def stop(self):
+        self.log_config.delete()
+
+    def _on_data(self, _timestamp, data, _logconf):
+        self.snapshot = RangeSnapshot(*(_to_meters(data[f"range.{d}"]) for d in RANGE_DIRECTIONS),
+                                      position=tuple(data[f"stateEstimate.{a}"] for a in "xyz"),
+                                      yaw=data["stateEstimate.yaw"],
+                                      timestamp=time.monotonic())
+        self.updates += 1
+
+    def latest(self):
+        return self.snapshot
+
+    def is_stale(self, snapshot=None):
+        return (self.snapshot if snapshot is None else snapshot).age() > self.max_age
+
+    def stats(self):
+        return f"telemetry: {self.updates} range updates, last one {self.snapshot.age():.2f}s ago"
@@ -1,9 +1,31 @@
+import argparse, json, time, warnings
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from sklearn.neighbors import KNeighborsClassifier
+from sklearn.neighbors import KNeighborsClassifier, NearestCentroid
+from sklearn.linear_model import LogisticRegression
+from sklearn.neural_network import MLPClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report, accuracy_score
 import joblib
 
+MODEL_PATH = "gesture_knn_model.pkl"  # loaded by main.py
+REPORT_PATH = "gesture_model_report.json"
+
+# === Candidate models for the same 126 features ===
+CANDIDATES = {
+    "knn": lambda: KNeighborsClassifier(n_neighbors=3),  # brute force over all samples
+    "kdtree": lambda: KNeighborsClassifier(n_neighbors=3, algorithm="kd_tree"),
+    "centroid": lambda: NearestCentroid(),  # one prototype per gesture
+    "logistic": lambda: make_pipeline(StandardScaler(), LogisticRegression(max_iter=2000)),
+    "mlp": lambda: make_pipeline(StandardScaler(), MLPClassifier(hidden_layer_sizes=(64,), max_iter=1000, random_state=42)),
+}
+
+parser = argparse.ArgumentParser(description="Train the gesture classifier")
+parser.add_argument("model", nargs="?", default="knn", choices=list(CANDIDATES) + ["best"],
+                    help="model to export, 'best' = fastest one within 1%% of the top accuracy")
+args = parser.parse_args()
+
 # === Load recorded 2-hand gesture data (safe read) ===
 try:
     df = pd.read_csv("gesture_data.csv", on_bad_lines='skip')
@@ -29,15 +51,43 @@ y = df["label"]
 # === Split dataset ===
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-# === Train classifier ===
-model = KNeighborsClassifier(n_neighbors=3)
-model.fit(X_train, y_train)
+# === Per-sample latency, one row at a time like the live loop in main.py ===
+def per_sample_ms(model, X, samples=200):
+    rows = X.to_numpy()[:samples]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # fitted with column names, fed NumPy rows
+        start = time.perf_counter()
+        for row in rows:
+            model.predict(row.reshape(1, -1))
+    return (time.perf_counter() - start) / len(rows) * 1000
+
+# === Train and evaluate the candidates ===
+names = list(CANDIDATES) if args.model == "best" else [args.model]
+results = {}
+for name in names:
+    model = CANDIDATES[name]()
+    model.fit(X_train, y_train)
+    accuracy = accuracy_score(y_test, model.predict(X_test))
+    results[name] = {"model": model, "accuracy": accuracy, "latency_ms": per_sample_ms(model, X_test)}
+    print(f"📊 {name:9s} accuracy {accuracy:.3f}  latency {results[name]['latency_ms']:.3f} ms/sample")
+
+if args.model == "best":
+    top = max(r["accuracy"] for r in results.values())
+    chosen = min((n for n, r in results.items() if r["accuracy"] >= top - 0.01),
+                 key=lambda n: results[n]["latency_ms"])
+else:
+    chosen = args.model
+model = results[chosen]["model"]
 
 # === Evaluate performance ===
 y_pred = model.predict(X_test)
-print("\n📊 Accuracy:", accuracy_score(y_test, y_pred))
+print(f"\n📊 Accuracy ({chosen}):", accuracy_score(y_test, y_pred))
 print(classification_report(y_test, y_pred))
 
-# === Save trained model ===
-joblib.dump(model, "gesture_knn_model.pkl")
-print("✅ Model saved as 'gesture_knn_model.pkl'")
+# === Save trained model with its report ===
+joblib.dump(model, MODEL_PATH)
+with open(REPORT_PATH, "w") as f:
+    json.dump({"chosen": chosen,
+               "candidates": {n: {"accuracy": r["accuracy"], "latency_ms": r["latency_ms"]} for n, r in results.items()}},
+              f, indent=2)
+print(f"✅ Model '{chosen}' saved as '{MODEL_PATH}', report in '{REPORT_PATH}'")
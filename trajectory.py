@@ -0,0 +1,113 @@
+import hashlib, math, time
+
+from cflib.crazyflie.mem import MemoryElement, Poly4D
+
+from maneuvers import Maneuver
+
+#Firmware limit on defined trajectories (ids 0 to MAX_TRAJECTORIES - 1)
+MAX_TRAJECTORIES = 10
+#Minimum-jerk blend from 0 to 1 over tau in [0, 1]: 35 t^4 - 84 t^5 + 70 t^6 - 20 t^7
+#(zero velocity, acceleration and jerk at both ends)
+BLEND = (0.0, 0.0, 0.0, 0.0, 35.0, -84.0, 70.0, -20.0)
+
+
+def _hold(pose, duration):
+    return Poly4D(duration, *(Poly4D.Poly([value] + [0.0] * 7) for value in pose))
+
+
+#Signed angle from a to b in (-pi, pi], the way go_to turns
+def _shortest_turn(a, b):
+    turn = (b - a) % (2 * math.pi)
+    return turn - 2 * math.pi if turn > math.pi else turn
+
+
+def _move(start, end, duration):
+    return Poly4D(duration, *(Poly4D.Poly([a] + [(b - a) * c / duration ** k for k, c in enumerate(BLEND) if k])
+                              for a, b in zip(start, end)))
+
+
+#Polynomial pieces of a maneuver, relative to start (x, y, z) so it can run from wherever the
+#drone is. Yaw is in degrees in the maneuvers and radians on the Crazyflie, and each yaw is
+#unwrapped against the previous one so the drone turns the short way like go_to does.
+#None if the maneuver can't run as a trajectory (landing, relative or overlapping moves)
+def compile_maneuver(maneuver, start):
+    pieces = []
+    pose = (0.0, 0.0, 0.0, 0.0)
+    t = 0.0
+    for at, kind, args in maneuver.setpoints:
+        if kind != "go_to" or len(args) != 5 or at < t - 1e-6:
+            return None
+        if at > t + 1e-6:
+            pieces.append(_hold(pose, at - t))
+        x, y, z, yaw, duration = args
+        heading = pose[3] + _shortest_turn(pose[3], math.radians(yaw))
+        target = (x - start[0], y - start[1], z - start[2], heading)
+        pieces.append(_move(pose, target, duration))
+        pose, t = target, at + duration
+    if not pieces:
+        return None
+    if maneuver.duration > t + 1e-6:
+        pieces.append(_hold(pose, maneuver.duration - t))
+    return pieces
+
+
+def trajectory_memory(cf):
+    mems = cf.mem.get_mems(MemoryElement.TYPE_TRAJ)
+    return mems[0] if mems else None
+
+
+#Uploads compiled maneuvers to the Crazyflie's trajectory memory once and hands back a
+#maneuver that just starts them. Uploads are keyed by a hash of the packed pieces, so the
+#same animation or trick from the same height is only sent over the radio the first time.
+#When the memory or the trajectory ids run out everything is uploaded again from the start
+#(only call it when no trajectory is flying).
+class TrajectoryLibrary:
+    def __init__(self, commander, memory):
+        self.commander = commander
+        self.memory = memory
+        self.uploaded = {}  # content hash -> (trajectory id, duration)
+        self.offset = 0
+        self.uploads = 0
+        self.hits = 0
+        self.upload_time = 0.0
+
+    #A maneuver running `maneuver` as an uploaded trajectory, None to stream it instead
+    def compiled(self, maneuver, start):
+        pieces = compile_maneuver(maneuver, start)
+        if self.memory is None or pieces is None:
+            return None
+        data = b"".join(piece.pack() for piece in pieces)
+        key = hashlib.sha1(data).hexdigest()
+        entry = self.uploaded.get(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            entry = self._upload(key, pieces, len(data))
+            if entry is None:
+                return None
+        trajectory_id, duration = entry
+        return Maneuver(maneuver.name, watch=maneuver.watch).start_trajectory(trajectory_id, duration)
+
+    def _upload(self, key, pieces, size):
+        if size > self.memory.size:
+            print(f"Trajectory of {len(pieces)} pieces does not fit in {self.memory.size} bytes, streaming it")
+            return None
+        if self.offset + size > self.memory.size or len(self.uploaded) >= MAX_TRAJECTORIES:
+            self.uploaded.clear()
+            self.offset = 0
+        start = time.perf_counter()
+        self.memory.trajectory = pieces
+        if not self.memory.write_data_sync(start_addr=self.offset):
+            print("Trajectory upload failed, streaming it")
+            return None
+        trajectory_id = len(self.uploaded)
+        self.commander.define_trajectory(trajectory_id, self.offset, len(pieces))
+        self.offset += size
+        self.upload_time += time.perf_counter() - start
+        self.uploads += 1
+        entry = self.uploaded[key] = (trajectory_id, sum(piece.duration for piece in pieces))
+        return entry
+
+    def stats(self):
+        return (f"trajectories: {self.uploads} uploads ({self.upload_time:.2f}s), {self.hits} cache hits, "
+                f"{self.offset}/{self.memory.size if self.memory else 0} bytes used")
@@ -0,0 +1,109 @@
+import json, os, queue, threading
+from collections import namedtuple
+import numpy as np
+
+from maneuvers import TrickMove
+from pipeline import next_item
+
+#A learned trick: the recorded steps, its compile_trick plan when flown from `start`, and the
+#embedding of its name by encoder `model` (None when it has to be encoded again)
+Trick = namedtuple("Trick", ("name", "steps", "plan", "start", "embedding", "model"))
+
+
+def _encode_plan(plan):
+    return [[list(item.target), [list(m) for m in item.moves]] if isinstance(item, TrickMove) else item
+            for item in plan]
+
+
+def _decode_plan(plan):
+    return [TrickMove(tuple(item[0]), [tuple(m) for m in item[1]]) if isinstance(item, list) else item
+            for item in plan]
+
+
+#Learned tricks kept in a JSON-lines file, one trick per line, a later line for the same name
+#replaces the earlier one. The file is read by a background thread at startup (tricks show up
+#in take_loaded() once read) and saves are appended by step() in its own pipeline stage, so
+#neither blocks the control loop.
+class TrickStore:
+    def __init__(self, path, model=None):
+        self.path = path
+        self.model = model
+        self.tricks = {}  # name -> Trick
+        self.loaded = queue.Queue()  # read from disk, not yet handed to take_loaded()
+        self.writes = queue.Queue()
+        self.written = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self._load, name="trick-store", daemon=True).start()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        latest = {}
+        with open(self.path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                    trick = Trick(record["name"], record["steps"], _decode_plan(record["plan"]),
+                                  record["start"], record.get("embedding"), record.get("model"))
+                except (ValueError, KeyError, TypeError, IndexError) as e:
+                    print(f"Skipping line {number} of {self.path}: {e}")
+                    continue
+                if trick.model != self.model:
+                    trick = trick._replace(embedding=None)
+                latest[trick.name] = trick
+        with self.lock:
+            for name, trick in latest.items():
+                self.tricks.setdefault(name, trick)  # tricks learned meanwhile win
+        for trick in latest.values():
+            self.loaded.put(trick)
+        print(f"Loaded {len(latest)} learned tricks from {self.path}")
+
+    #Tricks read from disk since the last call, for registering their names with the classifier
+    def take_loaded(self):
+        tricks = []
+        while not self.loaded.empty():
+            tricks.append(self.loaded.get_nowait())
+        return tricks
+
+    def __contains__(self, name):
+        with self.lock:
+            return name in self.tricks
+
+    def get(self, name):
+        with self.lock:
+            return self.tricks.get(name)
+
+    #Keeps the trick in memory right away, the file write happens in step()
+    def save(self, name, steps, plan, start, embedding=None):
+        trick = Trick(name, list(steps), plan, list(start),
+                      None if embedding is None else [float(x) for x in np.ravel(embedding)], self.model)
+        with self.lock:
+            self.tricks[name] = trick
+        self.writes.put(trick)
+        return trick
+
+    def _append(self, tricks):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for trick in tricks:
+                record = trick._asdict()
+                record["plan"] = _encode_plan(trick.plan)
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.written += len(tricks)
+
+    def step(self, timeout=0.1):
+        trick = next_item(self.writes, timeout)
+        if trick is not None:
+            self._append([trick])
+
+    #Write whatever is still queued, on shutdown
+    def flush(self):
+        pending = []
+        while not self.writes.empty():
+            pending.append(self.writes.get_nowait())
+        if pending:
+            self._append(pending)
+
+    def stats(self):
+        with self.lock:
+            count = len(self.tricks)
+        return f"tricks: {count} known, {self.written} saved to {self.path}"